@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from collections import defaultdict
+from pathlib import Path
+
+import yaml
+import paho.mqtt.client as mqtt
+
+from common.broker import StandInBroker
+
+ROOT = Path(__file__).resolve().parent
+IN_TOPIC, OUT_TOPIC = 'in/data', 'out/data'
+
+
+def wait_until(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return condition()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Check the multi-worker engine against a local stand-in broker')
+    parser.add_argument('--workers', '-w', type=int, default=3, help='Number of engine worker processes')
+    parser.add_argument('--partitions', '-p', type=int, default=6, help='Number of topic partitions')
+    parser.add_argument('--messages', '-n', type=int, default=2000, help='Number of messages to publish')
+    parser.add_argument('--devices', type=int, default=50, help='Number of device keys')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Timeout for each step, seconds')
+    args = parser.parse_args()
+
+    # Брокер работает в отдельном потоке, чтобы сценарий мог опрашивать его подписки
+    broker = StandInBroker(port=0)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(broker.start(), loop).result()
+
+    def published() -> int:
+        # Брокер считает и сообщения, которые движок публикует в выходной топик
+        return sum(count for topic, count in broker.published.items() if topic.startswith(IN_TOPIC))
+
+    endpoint = {'address': '127.0.0.1', 'port': broker.port, 'timeout': 0, 'protocol': '5'}
+
+    received = []
+    collector = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, protocol=mqtt.MQTTv5)
+    collector.on_message = lambda client, userdata, msg: received.append(json.loads(msg.payload))
+    collector.connect(endpoint['address'], endpoint['port'])
+    collector.subscribe(OUT_TOPIC)
+    collector.loop_start()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # Каждое второе сообщение без ключа устройства идет через общую подписку, остальные - по разделам
+        messages = [
+            {'device': f'd{seq % args.devices}' if seq % 2 else None, 'seq': seq}
+            for seq in range(args.messages)
+        ]
+        (tmp / 'messages.json').write_text(json.dumps(messages))
+        (tmp / 'engine.yml').write_text(yaml.safe_dump({
+            'broker': {**endpoint, 'topic': IN_TOPIC},
+            'publish_topic': {**endpoint, 'topic': OUT_TOPIC},
+            'position': [37.41, 55.80, 150],
+            'operation_group': 'none',
+            'data_format': 'tle',
+            'partitions': args.partitions,
+            'outbox_path': str(tmp / 'outbox'),
+        }))
+        (tmp / 'publisher.yml').write_text(yaml.safe_dump({
+            'broker': {**endpoint, 'topic': IN_TOPIC},
+            'file_to_publish': str(tmp / 'messages.json'),
+            'device_field': 'device',
+            'partitions': args.partitions,
+        }))
+
+        log_path = tmp / 'engine.log'
+        with log_path.open('w') as log_file:
+            engine = subprocess.Popen(
+                [sys.executable, 'run.py', '-c', str(tmp / 'engine.yml'), '-s', 'engine', '--workers', str(args.workers)],
+                cwd=ROOT, stdout=log_file, stderr=subprocess.STDOUT,
+            )
+            try:
+                partitions = [f'{IN_TOPIC}/{partition}' for partition in range(args.partitions)]
+                ready = wait_until(
+                    lambda: broker.subscribers(IN_TOPIC) == args.workers
+                    and all(broker.subscribers(topic) == 1 for topic in partitions),
+                    args.timeout,
+                )
+                if not ready:
+                    failures.append('engine workers did not subscribe to the shared topic and every partition')
+                else:
+                    # Издатель после отправки файла не завершается сам, его останавливаем, когда брокер получил все
+                    publisher = subprocess.Popen(
+                        [sys.executable, 'run.py', '-c', str(tmp / 'publisher.yml'), '-s', 'publisher'],
+                        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    )
+                    try:
+                        if not wait_until(lambda: published() >= args.messages, args.timeout):
+                            failures.append(f'publisher sent {published()} of {args.messages} messages')
+                    finally:
+                        publisher.terminate()
+                        publisher.wait()
+                    wait_until(lambda: len(received) >= args.messages, args.timeout)
+            finally:
+                engine.send_signal(signal.SIGTERM)
+                try:
+                    code = engine.wait(args.timeout)
+                except subprocess.TimeoutExpired:
+                    engine.kill()
+                    code = engine.wait()
+                    failures.append(f'engine did not stop within {args.timeout:g} sec after SIGTERM')
+        output = log_path.read_text()
+
+    collector.loop_stop()
+    collector.disconnect()
+    loop.call_soon_threadsafe(broker.close)
+
+    seqs = [message['seq'] for message in received]
+    missing = args.messages - len(set(seqs))
+    if missing:
+        failures.append(f'{missing} of {args.messages} messages were not delivered')
+    if len(seqs) != len(set(seqs)):
+        failures.append(f'{len(seqs) - len(set(seqs))} messages were delivered more than once')
+    per_device = defaultdict(list)
+    for message in received:
+        if message['device'] is not None:
+            per_device[message['device']].append(message['seq'])
+    unordered = [device for device, device_seqs in per_device.items() if device_seqs != sorted(device_seqs)]
+    if unordered:
+        failures.append(f'order was broken for {len(unordered)} devices, e.g. {unordered[0]}')
+    if code != 0:
+        failures.append(f'engine exited with code {code}')
+    if 'Traceback' in output:
+        failures.append('engine log contains a traceback')
+
+    print(f'Workers: {args.workers}, partitions: {args.partitions}, '
+          f'published: {args.messages}, delivered: {len(received)}, exit code: {code}')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        print(output[-4000:])
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import itertools
+import struct
+
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+SHARE_PREFIX = '$share/'
+
+
+def encode_length(length: int) -> bytes:
+    # Переменная длина MQTT: 7 бит на байт, старший бит - продолжение
+    result = bytearray()
+    while True:
+        length, byte = divmod(length, 128)
+        result.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(result)
+
+
+def decode_length(data: bytes, offset: int) -> Tuple[int, int]:
+    length, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        length |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return length, offset
+
+
+def encode_string(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack('>H', len(data)) + data
+
+
+def decode_string(data: bytes, offset: int) -> Tuple[str, int]:
+    size, = struct.unpack_from('>H', data, offset)
+    return data[offset + 2:offset + 2 + size].decode(), offset + 2 + size
+
+
+def packet(kind: int, body: bytes, flags: int = 0) -> bytes:
+    return bytes([kind << 4 | flags]) + encode_length(len(body)) + body
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels, topic_levels = topic_filter.split('/'), topic.split('/')
+    for k, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if k >= len(topic_levels) or level not in ('+', topic_levels[k]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Session:
+    def __init__(self, writer: asyncio.StreamWriter, version: int, client_id: str) -> None:
+        self.writer = writer
+        self.version = version
+        self.client_id = client_id
+
+    def send(self, data: bytes) -> None:
+        # Без drain: медленный подписчик не останавливает издателя, его данные копятся в буфере
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class StandInBroker:
+    """Локальная замена брокера MQTT для проверки оркестратора без mosquitto.
+
+    Поддерживает MQTT 3.1.1 и 5 в объеме, нужном сервисам: CONNECT, PUBLISH (доставка
+    подписчикам с QoS 0, пользовательские свойства v5 передаются как есть), SUBSCRIBE с
+    масками + и #, общие подписки $share/<группа>/<маска> (сообщение получает один участник
+    группы по кругу), UNSUBSCRIBE, PINGREQ, DISCONNECT. Сессии не сохраняются, retain и
+    will не поддерживаются.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 1883) -> None:
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        # маска -> подписчики; (группа, маска) -> участники общей подписки
+        self._subscriptions: Dict[str, List[_Session]] = defaultdict(list)
+        self._shared: Dict[Tuple[str, str], List[_Session]] = defaultdict(list)
+        self._turns: Dict[Tuple[str, str], itertools.count] = defaultdict(itertools.count)
+        self._client_ids = itertools.count()
+        # Число принятых PUBLISH по топикам
+        self.published: Counter = Counter()
+
+    def subscribers(self, topic_filter: str) -> int:
+        # Число подписок на маску, в том числе участников общих подписок любой группы
+        shared = sum(len(members) for (_, shared_filter), members in self._shared.items() if shared_filter == topic_filter)
+        return len(self._subscriptions.get(topic_filter, [])) + shared
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"Stand-in MQTT broker listening on {self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header >> 4, header & 0x0f, await reader.readexactly(length)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = None
+        try:
+            kind, _, body = await self._read_packet(reader)
+            if kind != CONNECT:
+                return
+            session = self._connect(writer, body)
+            while True:
+                kind, flags, body = await self._read_packet(reader)
+                if kind == PUBLISH:
+                    self._publish(session, flags, body)
+                elif kind == SUBSCRIBE:
+                    self._subscribe(session, body)
+                elif kind == UNSUBSCRIBE:
+                    self._unsubscribe(session, body)
+                elif kind == PINGREQ:
+                    session.send(packet(PINGRESP, b''))
+                elif kind == DISCONNECT:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                self._drop(session)
+            writer.close()
+
+    def _connect(self, writer: asyncio.StreamWriter, body: bytes) -> _Session:
+        _, offset = decode_string(body, 0)
+        version = body[offset]
+        # уровень протокола, флаги, keepalive
+        offset += 4
+        if version == 5:
+            length, offset = decode_length(body, offset)
+            offset += length
+        client_id, offset = decode_string(body, offset)
+        # Пустой идентификатор (paho по умолчанию) заменяется выданным брокером
+        session = _Session(writer, version, client_id or f'stand-in-{next(self._client_ids)}')
+        session.send(packet(CONNACK, b'\x00\x00\x00' if version == 5 else b'\x00\x00'))
+        log.debug(f"Client {session.client_id} connected (MQTT {'5' if version == 5 else '3.1.1'})")
+        return session
+
+    def _publish(self, session: _Session, flags: int, body: bytes) -> None:
+        topic, offset = decode_string(body, 0)
+        qos = (flags >> 1) & 0x03
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            session.send(packet(PUBACK, packet_id))
+        properties = b'\x00'
+        if session.version == 5:
+            length, start = decode_length(body, offset)
+            properties, offset = body[offset:start + length], start + length
+        payload = body[offset:]
+        self.published[topic] += 1
+
+        topic_part = encode_string(topic)
+        targets = [
+            subscriber
+            for topic_filter, subscribers in self._subscriptions.items() if topic_matches(topic_filter, topic)
+            for subscriber in subscribers
+        ]
+        for (group, topic_filter), members in self._shared.items():
+            if members and topic_matches(topic_filter, topic):
+                targets.append(members[next(self._turns[group, topic_filter]) % len(members)])
+        for subscriber in targets:
+            subscriber.send(packet(PUBLISH, topic_part + (properties if subscriber.version == 5 else b'') + payload))
+
+    def _filters(self, session: _Session, body: bytes, options: bool) -> Tuple[bytes, List[str]]:
+        packet_id, offset = body[:2], 2
+        if session.version == 5:
+            length, offset = decode_length(body, offset)
+            offset += length
+        filters = []
+        while offset < len(body):
+            topic_filter, offset = decode_string(body, offset)
+            filters.append(topic_filter)
+            offset += 1 if options else 0
+        return packet_id, filters
+
+    def _subscribe(self, session: _Session, body: bytes) -> None:
+        packet_id, filters = self._filters(session, body, options=True)
+        for topic_filter in filters:
+            if topic_filter.startswith(SHARE_PREFIX):
+                group, real_filter = topic_filter[len(SHARE_PREFIX):].split('/', 1)
+                members = self._shared[group, real_filter]
+            else:
+                members = self._subscriptions[topic_filter]
+            if session not in members:
+                members.append(session)
+        # Выдается QoS 0 для каждой маски
+        session.send(packet(SUBACK, packet_id + (b'\x00' if session.version == 5 else b'') + bytes(len(filters))))
+
+    def _unsubscribe(self, session: _Session, body: bytes) -> None:
+        packet_id, filters = self._filters(session, body, options=False)
+        for topic_filter in filters:
+            if topic_filter.startswith(SHARE_PREFIX):
+                group, real_filter = topic_filter[len(SHARE_PREFIX):].split('/', 1)
+                members = self._shared.get((group, real_filter), [])
+            else:
+                members = self._subscriptions.get(topic_filter, [])
+            if session in members:
+                members.remove(session)
+        reasons = b'\x00' + bytes(len(filters)) if session.version == 5 else b''
+        session.send(packet(UNSUBACK, packet_id + reasons))
+
+    def _drop(self, session: _Session) -> None:
+        for members in [*self._subscriptions.values(), *self._shared.values()]:
+            if session in members:
+                members.remove(session)
+        log.debug(f"Client {session.client_id} disconnected")
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description='Run a local stand-in MQTT broker')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listen address')
+    parser.add_argument('--port', '-p', type=int, default=1883, help='Listen port')
+    args = parser.parse_args()
+    asyncio.run(StandInBroker(args.host, args.port).serve_forever())
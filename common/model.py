@@ -1,10 +1,11 @@
 import paho.mqtt.client as mqtt
-import asyncio
 
 from logging import getLogger
 
 from pydantic import Field, BaseModel
-from typing import Optional, Union, List, Dict
+from typing import Literal, Optional, Union, List, Dict
+
+from common.transport import AsyncioMQTTTransport
 
 JsonSimpleType = Union[int, float, bool, None, str]
 JsonType = Union[JsonSimpleType, List['JSONType'], Dict[str, 'JSONType']]
@@ -20,6 +21,7 @@ class MQTTConfig(BaseModel):
     username: Optional[str] = Field(None, description="Логин для аутентификации")
     password: Optional[str] = Field(None, description="Пароль пользователя")
     timeout: int = Field(description="Таймаут между отправкой сообщений")
+    protocol: Literal['3.1.1', '5'] = Field('3.1.1', description="Версия протокола MQTT")
 
 
 class BaseMQTTServiceConfig(BaseModel):
@@ -36,10 +38,13 @@ class BaseMQTTService:
         self._password = config.broker.password
         self._timeout = config.broker.timeout
 
-        self._client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self._protocol = mqtt.MQTTv5 if config.broker.protocol == '5' else mqtt.MQTTv311
+        self._client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, protocol=self._protocol)
         self._client.on_connect = self.on_connect
         self._client.on_disconnect = self.on_disconnect
         self._client.on_message = self.on_message
+        # Сокет клиента обслуживается циклом событий, отдельного сетевого потока нет
+        self._transport = AsyncioMQTTTransport(self._client)
 
     def on_connect(self, client, userdata, flags, rc, properties) -> None:
         log.info(f"Connected to MQTT Broker: {self._address}:{self._port} with result code {rc}")
@@ -51,14 +56,10 @@ class BaseMQTTService:
         log.info(f"Disconnected with result code {rc}")
 
     async def connect(self):
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._client.connect, self._address, self._port)
-        self._client.loop_start()
+        await self._transport.connect(self._address, self._port)
 
     async def disconnect(self):
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._client.disconnect)
-        self._client.loop_stop()
+        await self._transport.disconnect()
 
     def on_message(self, client, userdata, message):
         # Переопределяем этот метод в подклассе, чтобы обрабатывать входящие сообщения
@@ -72,3 +73,7 @@ class BaseMQTTService:
 
     async def run(self) -> None:
         raise NotImplementedError
+
+    async def stop(self) -> None:
+        # Вызывается при SIGTERM/SIGINT после отмены run
+        await self.disconnect()
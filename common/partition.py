@@ -0,0 +1,21 @@
+import zlib
+
+from typing import List
+
+
+def partition_of(device: str, partitions: int) -> int:
+    # Устойчивый между процессами хеш (hash() для строк рандомизирован)
+    return zlib.crc32(device.encode()) % partitions
+
+
+def partition_topic(topic: str, device: str, partitions: int) -> str:
+    return f'{topic}/{partition_of(device, partitions)}'
+
+
+def shared_topic(group: str, topic: str) -> str:
+    # Общая подписка MQTT v5: каждое сообщение получает один из подписчиков группы
+    return f'$share/{group}/{topic}'
+
+
+def worker_partitions(worker: int, workers: int, partitions: int) -> List[int]:
+    return list(range(worker, partitions, workers))
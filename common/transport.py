@@ -0,0 +1,176 @@
+import asyncio
+import socket
+import threading
+
+from typing import Callable, Optional
+
+import paho.mqtt.client as mqtt
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+
+class AsyncioMQTTTransport:
+    """Обслуживание сокета клиента paho циклом событий asyncio вместо потока loop_start.
+
+    Чтение и запись выполняются обратными вызовами add_reader/add_writer, keepalive и
+    переподключение - задачей с loop_misc раз в секунду. Обратные вызовы paho (on_message и
+    другие) приходят в потоке цикла событий, publish только ставит пакет в очередь paho и
+    регистрирует запись, поэтому ни прием, ни отправка не переходят между потоками.
+    Несколько клиентов могут работать в одном цикле событий.
+
+    pause_reading снимает чтение сокета: брокер упирается в окно TCP и перестает слать
+    сообщения. Чтобы не потерять соединение по keepalive, каждые max_pause секунд из сокета
+    читается до keepalive_packets пакетов (среди них PINGRESP), после чего пауза продолжается
+    до resume_reading.
+    """
+
+    def __init__(self, client: mqtt.Client, reconnect_delay: float = 1.0, max_reconnect_delay: float = 60.0,
+                 max_pause: float = 30.0, keepalive_packets: int = 100) -> None:
+        self._client = client
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_pause = max_pause
+        self.keepalive_packets = keepalive_packets
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[int] = None
+        self._sock: Optional[socket.socket] = None
+        self._misc: Optional[asyncio.Task] = None
+        self._closed: Optional[asyncio.Future] = None
+        self._resume: Optional[asyncio.TimerHandle] = None
+        self._closing = False
+        # paused - пауза запрошена владельцем, _reading - чтение сокета включено сейчас
+        self.paused = False
+        self._reading = True
+        # Сколько пакетов еще прочитать до возврата к паузе (None - вне окна keepalive)
+        self._window: Optional[int] = None
+
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def _call(self, callback: Callable, *args) -> None:
+        # connect и reconnect выполняются в пуле потоков: регистрация сокета переносится в цикл
+        if threading.get_ident() == self._thread:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def on_socket_open(self, client, userdata, sock) -> None:
+        self._call(self._open, sock)
+
+    def on_socket_close(self, client, userdata, sock) -> None:
+        self._call(self._close, sock)
+
+    def on_socket_register_write(self, client, userdata, sock) -> None:
+        self._call(self._loop.add_writer, sock, self._write)
+
+    def on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self._call(self._loop.remove_writer, sock)
+
+    def _open(self, sock: socket.socket) -> None:
+        self._sock = sock
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048 * 1024)
+        if self._reading:
+            self._loop.add_reader(sock, self._read)
+
+    def _close(self, sock: socket.socket) -> None:
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._sock is sock:
+            self._sock = None
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def _read(self) -> None:
+        self._client.loop_read()
+        if self._window is not None:
+            self._window -= 1
+            if self._window <= 0:
+                self._pause_again()
+
+    def _write(self) -> None:
+        self._client.loop_write()
+
+    async def connect(self, host: str, port: int = 1883, keepalive: int = 60) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        self._closing = False
+        # Разрешение имени и TCP-соединение блокируют, поэтому выполняются вне цикла событий
+        await self._loop.run_in_executor(None, self._client.connect, host, port, keepalive)
+        if self._misc is None or self._misc.done():
+            self._misc = asyncio.create_task(self.misc())
+
+    async def reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                await self._loop.run_in_executor(None, self._client.reconnect)
+                return
+            except OSError as e:
+                log.warning(f"MQTT reconnect failed: {e}, next attempt in {delay:.0f} sec")
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def misc(self) -> None:
+        while not self._closing:
+            if self._client.loop_misc() == mqtt.MQTT_ERR_NO_CONN and not self._closing:
+                await self.reconnect()
+                continue
+            await asyncio.sleep(1)
+
+    def _set_reading(self, reading: bool) -> None:
+        if reading == self._reading:
+            return
+        self._reading = reading
+        if self._sock is None:
+            return
+        if reading:
+            self._loop.add_reader(self._sock, self._read)
+        else:
+            self._loop.remove_reader(self._sock)
+
+    def _keepalive_window(self) -> None:
+        # Чтение ограниченного числа пакетов, затем пауза продолжается, пока ее не снимут
+        self._resume = None
+        self._window = self.keepalive_packets
+        self._set_reading(True)
+
+    def _pause_again(self) -> None:
+        self._window = None
+        self._set_reading(False)
+        self._resume = self._loop.call_later(self.max_pause, self._keepalive_window)
+
+    def pause_reading(self) -> None:
+        if self.paused:
+            return
+        self.paused = True
+        self._pause_again()
+
+    def resume_reading(self) -> None:
+        if not self.paused:
+            return
+        self.paused = False
+        self._window = None
+        if self._resume is not None:
+            self._resume.cancel()
+            self._resume = None
+        self._set_reading(True)
+
+    async def disconnect(self, timeout: float = 5.0) -> None:
+        # DISCONNECT уходит после уже поставленных в очередь сообщений
+        self._closing = True
+        if self._sock is not None:
+            self._closed = self._loop.create_future()
+            self._client.disconnect()
+            try:
+                await asyncio.wait_for(self._closed, timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"MQTT socket was not closed in {timeout} sec")
+        if self._misc is not None:
+            self._misc.cancel()
+        if self._resume is not None:
+            self._resume.cancel()
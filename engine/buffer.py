@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from logging import getLogger
+
+from engine.outbox import OutboxRecord
+
+log = getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+DROP_LOWEST_PRIORITY = 'drop_lowest_priority'
+COALESCE_PER_DEVICE = 'coalesce_per_device'
+POLICIES = (DROP_OLDEST, DROP_LOWEST_PRIORITY, COALESCE_PER_DEVICE)
+
+
+class _Entry:
+    __slots__ = ('key', 'record', 'alive')
+
+    def __init__(self, key: tuple, record: OutboxRecord) -> None:
+        # (приоритет, срок доставки, порядковый номер)
+        self.key = key
+        self.record = record
+        self.alive = True
+
+    def __lt__(self, other: '_Entry') -> bool:
+        return self.key < other.key
+
+
+class _Worst:
+    # Обертка для кучи "наименее срочных": обратный порядок ключа
+    __slots__ = ('entry',)
+
+    def __init__(self, entry: _Entry) -> None:
+        self.entry = entry
+
+    def __lt__(self, other: '_Worst') -> bool:
+        return self.entry.key > other.entry.key
+
+
+class PriorityBuffer:
+    """Очередь исходящих сообщений в памяти с тем же интерфейсом, что и Outbox.
+
+    Сообщения выдаются по приоритету (0 - самый срочный), затем по сроку доставки, затем в
+    порядке поступления. При заполнении до capacity применяется политика переполнения:
+    drop_oldest - вытеснить самое старое сообщение; drop_lowest_priority - вытеснить
+    наименее срочное (или отбросить новое, если оно само наименее срочное);
+    coalesce_per_device - заменить сообщение того же устройства новым, а для нового
+    устройства вытеснить самое старое (контейнер SBD заменяется, только если собран из сообщений
+    одного устройства). На high_watermark вызывается on_pause (прием из
+    брокера приостанавливается), на low_watermark - on_resume.
+
+    Удаление ленивое: вытесненные записи помечаются и пропускаются при извлечении.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, policy: str = DROP_OLDEST,
+                 high_watermark: Optional[int] = None, low_watermark: Optional[int] = None,
+                 on_pause: Optional[Callable[[], None]] = None, on_resume: Optional[Callable[[], None]] = None) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}, expected one of {POLICIES}")
+        self.capacity = capacity
+        self.policy = policy
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark if low_watermark is not None else high_watermark
+        self._on_pause = on_pause
+        self._on_resume = on_resume
+
+        self._heap: List[_Entry] = []
+        self._fifo = deque()
+        self._worst: List[_Worst] = []
+        self._devices: Dict[str, _Entry] = {}
+        self._order = itertools.count()
+        self._size = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiter: Optional[asyncio.Future] = None
+
+        self.paused = False
+        self.dropped_oldest = 0
+        self.dropped_priority = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def ready(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'depth': self._size,
+            'dropped_oldest': self.dropped_oldest,
+            'dropped_priority': self.dropped_priority,
+            'coalesced': self.coalesced,
+            'paused': int(self.paused),
+        }
+
+    def _kill(self, entry: _Entry) -> None:
+        entry.alive = False
+        self._size -= 1
+        device = entry.record.device
+        if device is not None and self._devices.get(device) is entry:
+            del self._devices[device]
+
+    def _oldest(self) -> _Entry:
+        while not self._fifo[0].alive:
+            self._fifo.popleft()
+        return self._fifo[0]
+
+    def _least_urgent(self) -> _Entry:
+        while not self._worst[0].entry.alive:
+            heapq.heappop(self._worst)
+        return self._worst[0].entry
+
+    def _make_room(self, key: tuple, device: Optional[str]) -> bool:
+        # False - новое сообщение отбрасывается
+        if self.policy == COALESCE_PER_DEVICE and device is not None and device in self._devices:
+            self._kill(self._devices[device])
+            self.coalesced += 1
+            return True
+        if self.policy == DROP_LOWEST_PRIORITY:
+            worst = self._least_urgent()
+            if key[:2] >= worst.key[:2]:
+                self.dropped_priority += 1
+                return False
+            self._kill(worst)
+            self.dropped_priority += 1
+            return True
+        self._kill(self._oldest())
+        self.dropped_oldest += 1
+        return True
+
+    def append(self, payload, priority: int = 0, deadline: Optional[float] = None, device: Optional[str] = None,
+               received: Optional[float] = None) -> None:
+        key = (priority, float('inf') if deadline is None else deadline, next(self._order))
+        if self.capacity is not None and self._size >= self.capacity and not self._make_room(key, device):
+            return
+
+        entry = _Entry(key, OutboxRecord(priority, deadline, payload, device, received))
+        heapq.heappush(self._heap, entry)
+        self._fifo.append(entry)
+        if self.policy == DROP_LOWEST_PRIORITY:
+            heapq.heappush(self._worst, _Worst(entry))
+        if self.policy == COALESCE_PER_DEVICE and device is not None:
+            self._devices[device] = entry
+        self._size += 1
+        self._compact()
+
+        if self.high_watermark is not None and not self.paused and self._size >= self.high_watermark:
+            self.paused = True
+            log.warning(f"Outgoing buffer reached {self._size} messages, consumption paused: {self.stats()}")
+            if self._on_pause is not None:
+                self._on_pause()
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def wait(self) -> None:
+        while not self._size:
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def take(self, limit: int) -> List[OutboxRecord]:
+        records = []
+        while self._heap and len(records) < limit:
+            entry = heapq.heappop(self._heap)
+            if entry.alive:
+                self._kill(entry)
+                records.append(entry.record)
+        self._compact()
+
+        if self.paused and self._size <= self.low_watermark:
+            self.paused = False
+            log.info(f"Outgoing buffer drained to {self._size} messages, consumption resumed")
+            if self._on_resume is not None:
+                self._on_resume()
+        return records
+
+    def _compact(self) -> None:
+        # Очереди хранят и удаленные записи: чистим, когда их становится много
+        if len(self._heap) > 2 * self._size + 1024:
+            self._heap = [entry for entry in self._heap if entry.alive]
+            heapq.heapify(self._heap)
+        if len(self._fifo) > 2 * self._size + 1024:
+            self._fifo = deque(entry for entry in self._fifo if entry.alive)
+        if len(self._worst) > 2 * self._size + 1024:
+            self._worst = [item for item in self._worst if item.entry.alive]
+            heapq.heapify(self._worst)
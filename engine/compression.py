@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bitarray import bitarray
+from logging import getLogger
+
+from common.huffman_adaptive_codebook import HuffmanAdaptiveCodebook
+
+log = getLogger(__name__)
+
+# Байт заголовка: флаг сжатия, версия словаря (4 бита), число бит дополнения (3 бита)
+COMPRESSED = 0x80
+VERSION_MASK = 0x0F
+PAD_MASK = 0x07
+
+# Состояние процесса пула: словарь загружается один раз инициализатором
+_codebook = None
+_alphabet = None
+
+
+def load_codebook(serialized: bytes) -> Tuple[HuffmanAdaptiveCodebook, frozenset]:
+    # Длина фраз в файле не хранится: берется по самой длинной фразе словаря
+    codebook = HuffmanAdaptiveCodebook()
+    codebook.deserialize_codebook(serialized)
+    codebook._max_phrase_length = max(len(phrase) for phrase in codebook._huffman_codes)
+    # Однобайтовые фразы: при их наличии кодер никогда не пропускает байт
+    alphabet = frozenset(phrase[0] for phrase in codebook._huffman_codes if len(phrase) == 1)
+    return codebook, alphabet
+
+
+def encode_payload(codebook: HuffmanAdaptiveCodebook, alphabet: frozenset, payload: bytes, version: int) -> bytes:
+    # Без потерь: байты вне алфавита словаря или отсутствие выигрыша - отправка как есть
+    if not alphabet.issuperset(payload):
+        return b'\x00' + payload
+    encoded = codebook.encode_data(payload)
+    pad = -len(encoded) % 8
+    if (len(encoded) + pad) // 8 >= len(payload):
+        return b'\x00' + payload
+    return bytes([COMPRESSED | (version & VERSION_MASK) << 3 | pad]) + encoded.tobytes()
+
+
+def decode_payload(codebooks: Dict[int, HuffmanAdaptiveCodebook], data: bytes) -> bytes:
+    # Приемная сторона: codebooks - словари по номеру версии из заголовка (4 бита)
+    header = data[0]
+    if not header & COMPRESSED:
+        return data[1:]
+    encoded = bitarray()
+    encoded.frombytes(data[1:])
+    pad = header & PAD_MASK
+    if pad:
+        del encoded[-pad:]
+    return codebooks[header >> 3 & VERSION_MASK].decode_data(encoded)
+
+
+def _init_worker(serialized: bytes) -> None:
+    global _codebook, _alphabet
+    _codebook, _alphabet = load_codebook(serialized)
+
+
+def _encode_batch(payloads: List[bytes], version: int) -> List[bytes]:
+    return [encode_payload(_codebook, _alphabet, payload, version) for payload in payloads]
+
+
+class CodebookCompressor:
+    """Сжатие исходящих сообщений словарем HuffmanAdaptiveCodebook в пуле процессов.
+
+    У каждой версии словаря свой пул. При изменении файла словаря новый пул создается
+    рядом со старым и подменяется одним присваиванием; пачки, начатые на старой версии,
+    дорабатывают в старом пуле, который затем закрывается.
+    """
+
+    def __init__(self, path: Path, workers: int = 2, reload_interval: float = 5.0, min_chunk: int = 64) -> None:
+        self.path = Path(path)
+        self.workers = workers
+        self.reload_interval = reload_interval
+        self.min_chunk = min_chunk
+
+        self.version = 0
+        self._mtime = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def ratio(self) -> float:
+        return self.compressed_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+    async def load(self) -> None:
+        loop = asyncio.get_running_loop()
+        mtime = os.stat(self.path).st_mtime_ns
+        serialized = await loop.run_in_executor(None, self.path.read_bytes)
+        # Проверка словаря до того, как на него переключатся рабочие процессы
+        await loop.run_in_executor(None, load_codebook, serialized)
+
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(serialized,))
+        previous = self._pool
+        self._pool, self.version, self._mtime = pool, self.version + 1, mtime
+        if previous is not None:
+            previous.shutdown(wait=False)
+        log.info(f"Codebook version {self.version} loaded from {self.path}")
+
+    async def compress(self, payloads: List[bytes]) -> List[bytes]:
+        # Версия и пул фиксируются на всю пачку
+        pool, version = self._pool, self.version
+        loop = asyncio.get_running_loop()
+        size = max(self.min_chunk, -(-len(payloads) // self.workers))
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(pool, _encode_batch, payloads[offset:offset + size], version)
+            for offset in range(0, len(payloads), size)
+        ])
+        compressed = [payload for chunk in chunks for payload in chunk]
+        self.raw_bytes += sum(len(payload) for payload in payloads)
+        self.compressed_bytes += sum(len(payload) for payload in compressed)
+        return compressed
+
+    async def watch(self) -> None:
+        # Горячая замена словаря при изменении файла
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime == self._mtime:
+                continue
+            try:
+                await self.load()
+            except Exception as e:
+                # Остаемся на прежней версии до следующего изменения файла
+                log.warning(f"Codebook {self.path} was not reloaded: {e}")
+                self._mtime = mtime
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from typing import Callable, List, Optional
+
+from logging import getLogger
+
+from engine.outbox import OutboxRecord
+
+log = getLogger(__name__)
+
+INFINITY = float('inf')
+
+
+class TokenBucket:
+    # Ограничение скорости: rate токенов в секунду, не больше burst накопленных
+
+    def __init__(self, rate: Optional[float], burst: float) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, count: int) -> int:
+        # Сколько сообщений можно отправить сейчас (от 1 до count); ждет, пока не появится хотя бы один токен
+        if not self.rate:
+            return count
+        self._refill()
+        while self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._refill()
+        granted = min(count, int(self._tokens))
+        self._tokens -= granted
+        return granted
+
+    def refund(self, count: int) -> None:
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + count)
+
+
+class Dispatcher:
+    """Отправка принятых сообщений без опроса очереди.
+
+    Цикл ждет сообщения, затем открытия шлюза (окна передачи), затем токенов ограничителя
+    скорости и отправляет все готовые сообщения пачкой до batch_size штук, упорядоченной по
+    приоритету и сроку доставки. Сообщения с истекшим сроком отбрасываются.
+    """
+
+    def __init__(self, source, publish: Callable[[List[OutboxRecord]], None],
+                 rate: Optional[float] = None, batch_size: int = 100, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        # Outbox или PriorityBuffer: wait(), ready(), take()
+        self._source = source
+        self._publish = publish
+        self._clock = clock
+        self._bucket = TokenBucket(rate, burst or batch_size)
+        self.batch_size = batch_size
+        self.sent = 0
+        self.expired = 0
+
+        # Шлюз открыт, пока разрешена передача
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    def open(self) -> None:
+        self.gate.set()
+
+    def close(self) -> None:
+        self.gate.clear()
+
+    def pending(self) -> int:
+        return self._source.ready()
+
+    async def _send(self) -> None:
+        count = await self._bucket.acquire(min(self.batch_size, self._source.ready()))
+        if not self.gate.is_set():
+            # Окно закрылось, пока ждали токены
+            self._bucket.refund(count)
+            return
+        # Единственный потребитель: готовых сообщений за время ожидания могло только прибавиться
+        batch = self._source.take(count)
+        now = self._clock()
+        fresh = [record for record in batch if record.deadline is None or record.deadline >= now]
+        self.expired += len(batch) - len(fresh)
+        if not fresh:
+            return
+        fresh.sort(key=lambda record: (record.priority, INFINITY if record.deadline is None else record.deadline))
+        self._publish(fresh)
+        self.sent += len(fresh)
+
+    async def run(self) -> None:
+        while True:
+            await self._source.wait()
+            await self.gate.wait()
+            await self._send()
+
+    async def drain(self) -> None:
+        # Досылка оставшегося при остановке, пока шлюз открыт (run уже остановлен)
+        while self._source.ready() and self.gate.is_set():
+            await self._send()
@@ -1,10 +1,31 @@
 import asyncio
+import json
+import time
+import numpy as np
 import paho.mqtt.client as mqtt
 
-from typing import Optional, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Literal, Optional, List, Tuple
 from pydantic import Field
 # BaseSettings moved from pydantic
 from common.model import BaseMQTTService, BaseMQTTServiceConfig, MQTTConfig
+from common.partition import shared_topic, worker_partitions
+from common.transport import AsyncioMQTTTransport
+from engine.buffer import PriorityBuffer
+from engine.compression import CodebookCompressor
+from engine.dispatcher import Dispatcher
+from engine.ingest import MessageIngestor
+from engine.metrics import MetricsRegistry
+from engine.outbox import Outbox, OutboxRecord, orphaned_slices
+from engine.packer import SBD_MAX_SIZE, ContainerPacker
+from engine.scheduler import TransmissionScheduler
+from orbital.chebyshev import ChebyshevEphemeris
+from orbital.contact_plan import ContactPlan, ContactWindow
+from orbital.ground_index import GroundTrackIndex
+from orbital.link_budget import DEFAULT_LINK_BUDGET, forecast_link_margin
+from orbital import rolling
+from orbital.geometry import haversine_distance
+from orbital.visibility import DEFAULT_ELEVATION_MASK
 from pathlib import Path
 
 from logging import getLogger
@@ -22,6 +43,60 @@ class EngineConfig(BaseMQTTServiceConfig):
     data_url: Optional[str] = Field(None, description="URL-источник для получения TLE данных")
     data_format: str = Field(description="Формат данных для описания астрономических величин спутников")
     publish_topic: MQTTConfig
+    contact_plan: Optional[Path] = Field(None, description="Путь к файлу с предрассчитанными окнами связи")
+    elevation_mask: float = Field(DEFAULT_ELEVATION_MASK, description="Минимальный угол места спутника, градусы")
+    ephemeris_cache: Optional[Path] = Field(None, description="Путь к файлу с чебышёвской аппроксимацией эфемерид")
+    link_budget: float = Field(DEFAULT_LINK_BUDGET, description="Энергетический бюджет линии без потерь на трассе, дБ")
+    catalog: Optional[Path] = Field(None, description="Каталог орбитальных элементов (по умолчанию data/<operation_group>.<data_format>)")
+    ephemeris_horizon: float = Field(6 * 3600, description="На сколько секунд вперед поддерживать скользящие эфемериды")
+    ephemeris_block: float = Field(3600, description="Длительность блока скользящих эфемерид, секунды")
+    simulation_start: Optional[float] = Field(None, description="Unix-время начала симуляции (по умолчанию реальное время)")
+    simulation_speed: float = Field(1.0, description="Ускорение симулированного времени")
+    position_topic: Optional[str] = Field(None, description="Топик с обновлениями координат подвижного терминала")
+    replan_distance: float = Field(10.0, description="Смещение терминала (км), после которого пересчитываются окна связи")
+    planes: Optional[Path] = Field(None, description="Состав орбитальных плоскостей: окна ищутся только у спутников достижимых плоскостей")
+    ground_cell: float = Field(1.0, description="Размер ячейки индекса подспутниковых трасс, градусы")
+    ingest_capacity: int = Field(10000, description="Максимум принятых, но не обработанных сообщений")
+    ingest_timeout: float = Field(1.0, description="Сколько секунд поток MQTT ждет места в очереди, прежде чем отбросить сообщение")
+    send_rate: Optional[float] = Field(None, description="Ограничение скорости отправки, сообщений в секунду (без ограничения по умолчанию)")
+    send_batch: int = Field(100, description="Максимум сообщений, отправляемых за одно пробуждение")
+    send_in_windows: bool = Field(False, description="Отправлять сообщения только во время окон связи")
+    outbox_path: Optional[Path] = Field(None, description="Каталог персистентной очереди исходящих сообщений (в памяти, если не задан)")
+    outbox_commit_interval: float = Field(0.05, description="Интервал групповой фиксации очереди на диск, секунды")
+    default_priority: int = Field(1, description="Приоритет сообщения без свойства priority (0 - самый срочный, до 3)")
+    message_ttl: Optional[float] = Field(None, description="Срок доставки сообщения без свойства deadline, секунды от приема")
+    window_guard: float = Field(0.0, description="Отступ от восхода и захода спутника при отправке, секунды")
+    sbd_packing: bool = Field(False, description="Упаковывать сообщения в контейнеры SBD перед постановкой в очередь")
+    sbd_size: int = Field(SBD_MAX_SIZE, description="Размер контейнера SBD, байт")
+    pack_max_age: float = Field(10.0, description="Максимальное время ожидания сообщения в неполном контейнере, секунды")
+    pack_flush_containers: int = Field(1, description="Сколько контейнеров данных накапливать перед упаковкой")
+    buffer_capacity: Optional[int] = Field(100000, description="Максимум сообщений в очереди исходящих в памяти")
+    buffer_policy: Literal['drop_oldest', 'drop_lowest_priority', 'coalesce_per_device'] = Field(
+        'drop_oldest', description="Политика переполнения очереди исходящих в памяти"
+    )
+    buffer_high_watermark: float = Field(0.9, description="Доля заполнения очереди, при которой прием из брокера приостанавливается")
+    buffer_low_watermark: float = Field(0.5, description="Доля заполнения очереди, при которой прием из брокера возобновляется")
+    codebook: Optional[Path] = Field(None, description="Сериализованный словарь HuffmanAdaptiveCodebook для сжатия сообщений")
+    codebook_reload: float = Field(5.0, description="Период проверки изменения файла словаря, секунды")
+    compression_workers: int = Field(2, description="Число процессов сжатия")
+    workers: int = Field(1, description="Число процессов движка, разбирающих общий входной топик")
+    worker: int = Field(0, description="Номер этого процесса движка, от 0 до workers - 1")
+    share_group: str = Field('engine', description="Группа общей подписки MQTT v5 для процессов движка")
+    partitions: int = Field(0, description="Число разделов входного топика по ключу устройства (0 - без разделов)")
+    metrics_port: Optional[int] = Field(None, description="Порт HTTP-эндпоинта /metrics (к нему прибавляется номер процесса)")
+    metrics_host: str = Field('127.0.0.1', description="Адрес HTTP-эндпоинта метрик")
+    metrics_interval: Optional[float] = Field(None, description="Период записи снимка метрик в журнал, секунды")
+    drain_timeout: float = Field(5.0, description="Сколько секунд при остановке досылать сообщения из очереди в памяти")
+
+    @property
+    def catalog_path(self) -> Path:
+        return self.catalog or Path('data') / f'{self.operation_group}.{self.data_format}'
+
+    @property
+    def observer(self) -> Tuple[float, float, float]:
+        # position: [долгота, широта, высота в метрах] -> (широта, долгота, высота)
+        lon, lat, elevation = self.position
+        return lat, lon, elevation
 
 
 class Engine(BaseMQTTService):
@@ -29,22 +104,122 @@ class Engine(BaseMQTTService):
         super().__init__(config=config)
 
         self._position = config.position
+        self._observer = config.observer
+        self._planned_observer = config.observer
+        self._position_topic = config.position_topic
+        self._replan_distance = config.replan_distance
+        self._loop = None
+        self._elevation_mask = config.elevation_mask
+        self._link_budget = config.link_budget
         self._operation_group = config.operation_group
         self._data_format = config.data_format
         self._data_url = config.data_url
 
-        self._message_queue = asyncio.Queue()
+        # Сообщения из потока paho в основной цикл событий
+        self._ingestor = MessageIngestor(config.ingest_capacity, config.ingest_timeout)
+        self._send_rate = config.send_rate
+        self._send_batch = config.send_batch
+        self._send_in_windows = config.send_in_windows
+        self._dispatcher = None
+        self._drain_timeout = config.drain_timeout
+        # Фоновые задачи run (отменяются в stop) и пачка, которая сейчас сжимается и сохраняется
+        self._tasks: List[asyncio.Task] = []
+        self._storing: Optional[asyncio.Future] = None
+
+        self._default_priority = config.default_priority
+        self._message_ttl = config.message_ttl
+        self._window_guard = config.window_guard
+
+        # Сжатие сообщений словарем, загружается в init()
+        self._compressor = None
+        if config.codebook:
+            self._compressor = CodebookCompressor(config.codebook, config.compression_workers, config.codebook_reload)
+
+        # Упаковка мелких сообщений в контейнеры SBD: одна передача на много записей телеметрии
+        self._packer = None
+        if config.sbd_packing:
+            self._packer = ContainerPacker(
+                config.sbd_size, config.pack_max_age, config.pack_flush_containers, clock=self.now,
+            )
+
+        # Несколько процессов: сообщения без ключа делятся общей подпиской, разделы топика по
+        # ключу устройства закреплены за процессами, чтобы сохранить порядок сообщений устройства
+        if not 0 <= config.worker < config.workers:
+            raise ValueError(f"Worker {config.worker} is out of range for {config.workers} workers")
+        self._workers = config.workers
+        self._worker = config.worker
+        self._share_group = config.share_group
+        self._partitions = worker_partitions(config.worker, config.workers, config.partitions)
+
+        # Локальный стек с приоритетами: сообщения ждут окна связи, на диске переживают перезапуск
+        if config.outbox_path:
+            # У каждого процесса своя часть очереди; части без владельца (число процессов изменилось) забираются
+            outbox_path = config.outbox_path / f'worker-{config.worker}'
+            self._outbox = Outbox(outbox_path, commit_interval=config.outbox_commit_interval)
+            for orphan in orphaned_slices(config.outbox_path, config.worker, config.workers):
+                log.info(f"Outbox {orphan}: {self._outbox.adopt(orphan)} queued messages adopted")
+            log.info(f"Outbox opened: {len(self._outbox)} queued messages in {outbox_path}")
+        else:
+            # Ограниченная очередь: при заполнении прием из брокера приостанавливается
+            capacity = config.buffer_capacity
+            self._outbox = PriorityBuffer(
+                capacity, config.buffer_policy,
+                int(capacity * config.buffer_high_watermark) if capacity else None,
+                int(capacity * config.buffer_low_watermark) if capacity else None,
+                on_pause=self._transport.pause_reading, on_resume=self._transport.resume_reading,
+            )
+
+        self._metrics_port = config.metrics_port
+        self._metrics_host = config.metrics_host
+        self._metrics_interval = config.metrics_interval
+        self._metrics_server = None
+        self.metrics = MetricsRegistry('engine_')
+        self.register_metrics()
+
+        self._simulation_start = config.simulation_start
+        self._simulation_speed = config.simulation_speed
+        self._clock_origin = time.time()
+
+        self._contact_plan = None
+        if config.contact_plan:
+            self._contact_plan = ContactPlan.load(config.contact_plan)
+            log.info(f"Contact plan loaded: {len(self._contact_plan)} windows from {config.contact_plan}")
+
+        self._ephemeris = None
+        if config.ephemeris_cache:
+            self._ephemeris = ChebyshevEphemeris.load(config.ephemeris_cache)
+            log.info(f"Ephemeris cache loaded: {len(self._ephemeris.names)} satellites "
+                     f"(max error {self._ephemeris.max_error * 1000:.3f} m) from {config.ephemeris_cache}")
+
+        # Скользящие эфемериды и окна связи, достраиваются в фоне по мере движения времени
+        self._catalog_path = config.catalog_path
+        self._planes_path = config.planes
+        self._ephemeris_horizon = config.ephemeris_horizon
+        self._rolling = None
+        self._ground_index = None
+        if self._catalog_path.is_file():
+            self._rolling = rolling.RollingEphemeris.from_catalog(
+                self._catalog_path, self.now(), self._observer_km(self._observer),
+                block=config.ephemeris_block, mask=self._elevation_mask, planes_path=self._planes_path,
+            )
+            # Индекс подспутниковых точек по ячейкам широта/долгота для тех же блоков
+            self._ground_index = GroundTrackIndex(self._rolling.names, config.ground_cell)
+        else:
+            log.warning(f"No satellite catalog at {self._catalog_path}, rolling ephemeris is disabled")
 
         # SUBSCRIBE
         self._client.on_message = self.on_message
 
         # PUBLISH
         self._publish_topic = config.publish_topic
-        self._publish_client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        self._publish_client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            protocol=mqtt.MQTTv5 if self._publish_topic.protocol == '5' else mqtt.MQTTv311,
+        )
         if self._publish_topic.username and self._publish_topic.password:
             self._publish_client.username_pw_set(self._publish_topic.username, self._publish_topic.password)
-        self._publish_client.connect(self._publish_topic.address, self._publish_topic.port)
-        self._publish_client.loop_start()
+        # Оба клиента обслуживаются одним циклом событий
+        self._publish_transport = AsyncioMQTTTransport(self._publish_client)
 
     # def load_skyfield_tle(self, path: Path, operation_group=None, data_format=None, data_url=None):
     #     operation_group = operation_group or self._operation_group
@@ -64,43 +239,318 @@ class Engine(BaseMQTTService):
     #     if data_format == 'tle':
     #         return load.tle_file(data_url, filename=path / filename)
 
+    @staticmethod
+    def _observer_km(observer: Tuple[float, float, float]) -> Tuple[float, float, float]:
+        lat, lon, elevation = observer
+        return lat, lon, elevation / 1000
+
+    def now(self) -> float:
+        # Реальное или симулированное время
+        if self._simulation_start is None:
+            return time.time()
+        return self._simulation_start + (time.time() - self._clock_origin) * self._simulation_speed
+
+    def next_contact_window(self, t: Optional[float] = None) -> Optional[ContactWindow]:
+        # Ближайшее окно связи (открытое сейчас или следующее) без пропагации орбит
+        t = self.now() if t is None else t
+        if self._contact_plan is not None:
+            return self._contact_plan.next_window(t)
+        if self._rolling is not None:
+            return self._rolling.next_window(t)
+        return None
+
+    def contact_windows(self, t0: float, t1: float) -> List[ContactWindow]:
+        if self._contact_plan is not None:
+            return self._contact_plan.windows_between(t0, t1)
+        if self._rolling is not None:
+            return self._rolling.windows_between(t0, t1)
+        return []
+
+    def satellite_position(self, satellite: str, t: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
+        # Широта, долгота, высота (км) спутника по кэшу эфемерид, без SGP4
+        t = self.now() if t is None else t
+        if self._ephemeris is not None and self._ephemeris.start <= t <= self._ephemeris.end:
+            return self._ephemeris.geodetic(satellite, t)
+        if self._rolling is not None:
+            return self._rolling.geodetic(satellite, t)
+        return None
+
+    def satellites_near(self, lat: float, lon: float, radius: float, t0: float,
+                        t1: float) -> Dict[str, List[Tuple[float, float]]]:
+        # Интервалы, когда подспутниковая точка может быть ближе radius (км) к точке, по индексу ячеек
+        if self._ground_index is None:
+            return {}
+        return self._ground_index.satellites_near(lat, lon, radius, t0, t1)
+
+    async def maintain_ephemeris(self):
+        # Достраивание блоков эфемерид в отдельном процессе, чтобы не блокировать цикл событий
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(
+            max_workers=1, initializer=rolling._init_worker,
+            initargs=(str(self._catalog_path), str(self._planes_path) if self._planes_path else None),
+        )
+        try:
+            while True:
+                now = self.now()
+                for index in self._rolling.missing_blocks(now, now + self._ephemeris_horizon):
+                    observer = self._rolling.observer
+                    # Индекс подспутниковых точек строится там же: в цикле событий только присоединяется
+                    start, coefficients, max_error, windows, intervals = await loop.run_in_executor(
+                        executor, rolling.build_block,
+                        self._rolling.block_start(index), self._rolling.block, observer, self._elevation_mask,
+                        self._rolling.step, self._rolling.segment, self._ground_index.cell_size,
+                    )
+                    self._rolling.add_block(start, coefficients, max_error, windows, observer=observer)
+                    self._ground_index.add_intervals(start, start + self._rolling.block, intervals)
+                self._rolling.evict(now - self._rolling.block)
+                self._ground_index.evict(now - self._rolling.block)
+                await asyncio.sleep(self._rolling.block / 4 / self._simulation_speed)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def update_position(self, lat: float, lon: float, elevation: float = 0.0) -> None:
+        # Новые координаты терминала; окна пересчитываются только при смещении дальше replan_distance
+        self._observer = (lat, lon, elevation)
+        planned_lat, planned_lon, _ = self._planned_observer
+        distance = float(haversine_distance(planned_lat, planned_lon, lat, lon))
+        if distance < self._replan_distance:
+            return
+
+        log.info(f"Terminal moved {distance:.1f} km, replanning contact windows")
+        self._planned_observer = self._observer
+        if self._contact_plan is not None:
+            # Предрасчитанный план построен для старой позиции
+            log.info("Static contact plan dropped after position change")
+            self._contact_plan = None
+        if self._rolling is not None:
+            asyncio.create_task(self.replan())
+
+    async def replan(self):
+        # Пересчет окон по уже аппроксимированным эфемеридам, без повторной пропагации
+        observer = self._observer_km(self._planned_observer)
+        # Блоки, достроенные во время пересчета, сразу получают окна для новой позиции
+        self._rolling.observer = observer
+        blocks = self._rolling.snapshot()
+        loop = asyncio.get_running_loop()
+        try:
+            windows = await loop.run_in_executor(None, self._rolling.replan_windows, observer, blocks)
+        except Exception:
+            log.exception("Contact windows replanning failed")
+            return
+        self._rolling.set_windows(observer, windows)
+
+    @staticmethod
+    def parse_position(payload: str) -> Tuple[float, float, float]:
+        # {"lat": .., "lon": .., "alt": ..} или [долгота, широта, высота], как position в конфигурации
+        data = json.loads(payload)
+        if isinstance(data, dict):
+            return float(data['lat']), float(data['lon']), float(data.get('alt', 0.0))
+        lon, lat, *elevation = data
+        return float(lat), float(lon), float(elevation[0]) if elevation else 0.0
+
+    def link_margin_forecast(self, hours: float = 6, step: float = 10, start: Optional[float] = None):
+        # Кривая лучшего доступного запаса линии (дБ) на ближайшие hours часов по кэшу эфемерид
+        if self._ephemeris is None:
+            return None
+        # Интервал прогноза ограничен интервалом кэша; вне его прогноза нет
+        start = max(self.now() if start is None else start, self._ephemeris.start)
+        end = min(start + hours * 3600, self._ephemeris.end)
+        if end <= start:
+            return None
+        times = np.arange(start, end, step)
+        lat, lon, elevation = self._observer
+        margin, satellite = forecast_link_margin(
+            self._ephemeris.ephemeris(times), lat, lon, elevation / 1000, self._elevation_mask, self._link_budget
+        )
+        return times, margin, satellite
+
+    def message_properties(self, msg) -> Tuple[int, Optional[float], Optional[str]]:
+        # Приоритет, срок доставки и устройство из пользовательских свойств MQTT v5 или значения по умолчанию
+        properties = dict(getattr(getattr(msg, 'properties', None), 'UserProperty', None) or [])
+        priority, deadline = self._default_priority, None
+        try:
+            if 'priority' in properties:
+                priority = int(properties['priority'])
+            if 'deadline' in properties:
+                deadline = float(properties['deadline'])
+            elif 'ttl' in properties:
+                deadline = self.now() + float(properties['ttl'])
+        except ValueError:
+            log.warning(f"Malformed message properties: {properties}")
+        if deadline is None and self._message_ttl is not None:
+            deadline = self.now() + self._message_ttl
+        return priority, deadline, properties.get('device')
+
     def on_message(self, client, userdata, msg):
         # Обработка пришедшего сообщения из топика 1 и добавление его в очередь
-        message = msg.payload.decode()
-        # self._message_queue.put(message)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.process_message(message))
-
-    async def process_message(self, message: str):
-        # Добавление полученного сообщения в очередь
-        await self._message_queue.put(message)
+        if self._position_topic and msg.topic == self._position_topic:
+            message = msg.payload.decode()
+            try:
+                position = self.parse_position(message)
+            except (ValueError, KeyError, TypeError):
+                log.warning(f"Malformed position update: {message}")
+                return
+            self.update_position(*position)
+            return
+        self._received.inc()
+        priority, deadline, device = self.message_properties(msg)
+        self._ingestor.submit(OutboxRecord(priority, deadline, msg.payload, device, time.monotonic()))
 
     async def send_message(self, message: str):
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._client.publish, self._topic, message)
+        self._client.publish(self._topic, message)
         await asyncio.sleep(5)
 
     # async def cash_message(self, message):
     #     await self._message_queue.put(message)
 
-    async def send_messages_to_topic_2(self):
+    def register_metrics(self) -> None:
+        # Горячий путь обновляет только счетчик приема и гистограммы, остальное читается при снимке
+        metrics = self.metrics
+        self._received = metrics.counter('received_messages_total', "Принятые сообщения")
+        self._latency = metrics.histogram('ingest_publish_latency_seconds', "Задержка от приема до отправки")
+        self._batch_size = metrics.histogram('publish_batch_size', "Сообщений в одной отправке")
+        metrics.gauge('ingest_depth', "Принятые, но не обработанные сообщения", self._ingestor.qsize)
+        metrics.counter('ingest_dropped_total', "Отброшенные при переполнении приема", lambda: self._ingestor.dropped)
+        metrics.gauge('reading_paused', "Чтение из брокера приостановлено", lambda: int(self._transport.paused))
+        for name in self._outbox.stats():
+            # Глубина и пауза - текущие значения, остальное - накопленные счетчики вытеснений
+            if name in ('depth', 'paused'):
+                metrics.gauge(f'outbox_{name}', f"Очередь исходящих: {name}", lambda name=name: self._outbox.stats()[name])
+            else:
+                metrics.counter(f'outbox_{name}_total', f"Очередь исходящих: {name}",
+                                lambda name=name: self._outbox.stats()[name])
+        metrics.counter('sent_messages_total', "Отправленные сообщения",
+                        lambda: self._dispatcher.sent if self._dispatcher is not None else 0)
+        metrics.counter('expired_messages_total', "Отброшенные по сроку доставки",
+                        lambda: self._dispatcher.expired if self._dispatcher is not None else 0)
+        if self._compressor is not None:
+            compressor = self._compressor
+            metrics.gauge('compression_ratio', "Отношение сжатого размера к исходному", compressor.ratio)
+            metrics.counter('compression_raw_bytes_total', "Байт до сжатия", lambda: compressor.raw_bytes)
+            metrics.counter('compression_compressed_bytes_total', "Байт после сжатия", lambda: compressor.compressed_bytes)
+            # Может уменьшаться: несжимаемое сообщение уходит как есть с байтом заголовка
+            metrics.gauge('compression_saved_bytes', "Сэкономлено сжатием, байт",
+                          lambda: compressor.raw_bytes - compressor.compressed_bytes)
+            metrics.gauge('codebook_version', "Версия словаря сжатия", lambda: compressor.version)
+        if self._packer is not None:
+            packer = self._packer
+            metrics.gauge('container_fill_ratio', "Средняя заполненность контейнеров SBD", packer.fill_ratio)
+            metrics.counter('containers_total', "Собранные контейнеры SBD", lambda: packer.containers)
+            metrics.gauge('packer_pending', "Сообщения, ожидающие упаковки", lambda: len(packer))
+
+    def input_topics(self) -> List[str]:
+        topics = [shared_topic(self._share_group, self._topic) if self._workers > 1 else self._topic]
+        return topics + [f'{self._topic}/{partition}' for partition in self._partitions]
+
+    def queue_stats(self) -> Dict[str, int]:
+        # Глубина очередей и счетчики отброшенных сообщений
+        stats = {f'outbox_{name}': value for name, value in self._outbox.stats().items()}
+        stats.update(ingest_depth=self._ingestor.qsize(), ingest_dropped=self._ingestor.dropped,
+                     ingest_paused=int(self._transport.paused))
+        return stats
+
+    def publish_records(self, records: List[OutboxRecord]) -> None:
+        # paho только ставит сообщения в свою очередь, сокет пишется из цикла событий
+        now = time.monotonic()
+        for record in records:
+            self._publish_client.publish(self._publish_topic.topic, record.payload)
+            # Для контейнера SBD - по самому раннему из упакованных сообщений
+            if record.received is not None:
+                self._latency.record(now - record.received)
+        self._batch_size.record(len(records))
+
+    async def store_messages(self):
+        # Сжатие, упаковка и перенос принятых сообщений в очередь исходящих (на диск, если задан outbox_path)
         while True:
-            if not self._message_queue.empty():
-                message = await self._message_queue.get()
-                self._publish_client.publish(self._publish_topic.topic, message)
-                # await asyncio.sleep(0.1)
-                self._message_queue.task_done()  # Отмечаем выполнение задачи
-            await asyncio.sleep(5)  # Ожидание 5 секунд перед следующей отправкой
+            records = await self._ingestor.get_batch(self._send_batch * 10)
+            # Отмена при остановке не прерывает уже взятую из очереди пачку
+            self._storing = asyncio.ensure_future(self.store_batch(records))
+            await asyncio.shield(self._storing)
+
+    async def store_batch(self, records: List[OutboxRecord]) -> None:
+        if self._compressor is not None:
+            payloads = await self._compressor.compress([record.payload for record in records])
+            records = [record._replace(payload=payload) for record, payload in zip(records, payloads)]
+        for record in records:
+            if self._packer is None:
+                self._outbox.append(record.payload, record.priority, record.deadline, record.device, record.received)
+                continue
+            self.store_records(self._packer.add(
+                record.payload, record.priority, record.deadline, record.received, record.device,
+            ))
+
+    def store_records(self, records: List[OutboxRecord]) -> None:
+        for record in records:
+            self._outbox.append(record.payload, record.priority, record.deadline, record.device, record.received)
+
+    async def init(self):
+        if self._compressor is not None:
+            await self._compressor.load()
+        await super().init()
+        await self._publish_transport.connect(self._publish_topic.address, self._publish_topic.port)
 
     async def run(self):
-        # TODO: В конечной реализации будем слушать топик с сообщениями на отправку
-        # TODO: Если мы не готовы к отправке (по расписанию), то сообщение будет класться в локальный стек с приоритетом
-        self._client.subscribe(self._topic)
+        self._loop = asyncio.get_running_loop()
+        self._ingestor.start(self._loop)
+        self._outbox.start(self._loop)
+        if self._metrics_port is not None:
+            self._metrics_server = await self.metrics.serve(self._metrics_host, self._metrics_port + self._worker)
+        if self._metrics_interval:
+            self._tasks.append(asyncio.create_task(self.metrics.log_snapshots(self._metrics_interval)))
+        if isinstance(self._outbox, Outbox):
+            self._tasks.append(asyncio.create_task(self._outbox.run()))
+        self._tasks.append(asyncio.create_task(self.store_messages()))
+        if self._compressor is not None:
+            self._tasks.append(asyncio.create_task(self._compressor.watch()))
+        if self._packer is not None:
+            self._tasks.append(asyncio.create_task(self._packer.run(self.store_records, self._simulation_speed)))
+        self._dispatcher = Dispatcher(
+            self._outbox, self.publish_records, self._send_rate, self._send_batch, clock=self.now,
+        )
+        for topic in self.input_topics():
+            self._client.subscribe(topic)
+        log.info(f"Worker {self._worker + 1}/{self._workers} subscribed to {self.input_topics()}")
+        if self._position_topic:
+            self._client.subscribe(self._position_topic)
 
-        asyncio.create_task(self.send_messages_to_topic_2())
+        if self._rolling is not None:
+            self._tasks.append(asyncio.create_task(self.maintain_ephemeris()))
+        if self._send_in_windows:
+            # Окна появятся, когда будут достроены скользящие эфемериды
+            retry = self._rolling.block / 4 if self._rolling is not None else 900
+            scheduler = TransmissionScheduler(
+                self._dispatcher, self.next_contact_window, self.now, self._simulation_speed, self._window_guard, retry,
+            )
+            self._tasks.append(asyncio.create_task(scheduler.run()))
 
-        while True:
-            # await self.cash_message("Hello from MQTT")
-            # await asyncio.sleep(self._timeout)
-            await asyncio.sleep(0.1)
+        await self._dispatcher.run()
+
+    async def stop(self):
+        # Остановка без потерь: прием прекращается, принятое сохраняется, очередь закрывается.
+        # run (и с ним отправка) к этому моменту уже отменен
+        await self._transport.disconnect()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._storing is not None:
+            await asyncio.gather(self._storing, return_exceptions=True)
+        await self.store_batch(self._ingestor.take(self._ingestor.ready()))
+        if self._packer is not None:
+            self.store_records(self._packer.flush_all())
+
+        if isinstance(self._outbox, Outbox):
+            self._outbox.close()
+            log.info(f"Outbox closed: {len(self._outbox)} queued messages")
+        elif self._dispatcher is not None:
+            try:
+                await asyncio.wait_for(self._dispatcher.drain(), self._drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if len(self._outbox):
+                log.warning(f"{len(self._outbox)} queued messages are lost: the outgoing buffer is in memory")
+        await self._publish_transport.disconnect()
+
+        if self._compressor is not None:
+            self._compressor.close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+from collections import deque
+from typing import Any, List, Optional
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+
+class MessageIngestor:
+    """Передача сообщений из сетевого потока paho в цикл событий оркестратора.
+
+    Поток обратного вызова добавляет сообщения в список под блокировкой и будит цикл только
+    для первого сообщения пачки, поэтому поток сообщений стоит одного call_soon_threadsafe
+    на пачку. Емкость ограничена семафором: если оркестратор не успевает, поток paho
+    блокируется (и перестает читать сокет) не дольше timeout секунд, после чего сообщение
+    отбрасывается, чтобы не терять keepalive брокера. Если клиент обслуживается самим циклом
+    событий (AsyncioMQTTTransport), сообщение сразу попадает в очередь, а при ее
+    заполнении отбрасывается без ожидания.
+    """
+
+    def __init__(self, capacity: int = 10000, timeout: float = 1.0) -> None:
+        self.capacity = capacity
+        self.timeout = timeout
+        self.dropped = 0
+
+        self._slots = threading.Semaphore(capacity)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[int] = None
+        self._ready = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._thread = threading.get_ident()
+
+    def qsize(self) -> int:
+        return len(self._ready) + len(self._pending)
+
+    def empty(self) -> bool:
+        return not self._ready
+
+    def ready(self) -> int:
+        # Сообщения, уже переданные в цикл событий
+        return len(self._ready)
+
+    def submit(self, message: Any) -> bool:
+        # Вызывается из потока paho или из самого цикла событий (там ждать освобождения нельзя)
+        own = threading.get_ident() == self._thread
+        if not self._slots.acquire(blocking=not own, timeout=None if own else self.timeout):
+            self.dropped += 1
+            log.warning(f"Ingest queue is full ({self.capacity}), message dropped")
+            return False
+        if own:
+            self._ready.append(message)
+            self._wake()
+            return True
+        with self._lock:
+            self._pending.append(message)
+            wake = len(self._pending) == 1
+        if wake:
+            self._loop.call_soon_threadsafe(self._flush)
+        return True
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        self._ready.extend(batch)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def wait(self) -> None:
+        # Ожидание хотя бы одного сообщения без опроса (один потребитель)
+        while not self._ready:
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def get_nowait(self) -> Any:
+        message = self._ready.popleft()
+        self._slots.release()
+        return message
+
+    async def get(self) -> Any:
+        await self.wait()
+        return self.get_nowait()
+
+    def take(self, limit: int) -> List[Any]:
+        return [self.get_nowait() for _ in range(min(limit, len(self._ready)))]
+
+    async def get_batch(self, limit: int) -> List[Any]:
+        await self.wait()
+        return self.take(limit)
@@ -0,0 +1,194 @@
+import asyncio
+import math
+
+from typing import Callable, Dict, List, Optional, Union
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+Number = Union[int, float]
+
+
+def format_value(value: Number) -> str:
+    # Целые значения без потери точности: счетчики растут за пределы 6 значащих цифр
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    # Значение увеличивается inc или читается функцией fn у объекта, который ведет счет сам
+    __slots__ = ('name', 'help', 'value', 'fn')
+
+    def __init__(self, name: str, help: str = '', fn: Optional[Callable[[], Number]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount: Number = 1) -> None:
+        self.value += amount
+
+    def get(self) -> Number:
+        return self.fn() if self.fn is not None else self.value
+
+    def render(self) -> List[str]:
+        return [f'{self.name} {format_value(self.get())}']
+
+
+class Gauge:
+    # Значение задается set или читается функцией fn в момент снимка (без затрат на горячем пути)
+    __slots__ = ('name', 'help', 'value', 'fn')
+
+    def __init__(self, name: str, help: str = '', fn: Optional[Callable[[], Number]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value: Number) -> None:
+        self.value = value
+
+    def get(self) -> Number:
+        return self.fn() if self.fn is not None else self.value
+
+    def render(self) -> List[str]:
+        return [f'{self.name} {format_value(self.get())}']
+
+
+class Histogram:
+    """Гистограмма с логарифмическими корзинами, как в HdrHistogram.
+
+    Каждая степень двойки делится на 2**precision равных корзин, поэтому относительная
+    погрешность квантилей не больше 2**-precision (около 1% при precision=7) во всем
+    диапазоне значений. Запись - frexp и увеличение счетчика в словаре.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, name: str, help: str = '', precision: int = 7) -> None:
+        self.name = name
+        self.help = help
+        self.precision = precision
+        self._scale = 1 << (precision + 1)
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        mantissa, exponent = math.frexp(value)
+        return (exponent << (self.precision + 1)) + int(mantissa * self._scale)
+
+    def _value(self, index: int) -> float:
+        # Середина корзины
+        exponent, mantissa = divmod(index, self._scale)
+        return math.ldexp((mantissa + 0.5) / self._scale, exponent)
+
+    def record(self, value: float, count: int = 1) -> None:
+        index = self._index(value) if value > 0 else 0
+        self._buckets[index] = self._buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                value = self._value(index) if index else 0.0
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def reset(self) -> None:
+        self._buckets.clear()
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def render(self) -> List[str]:
+        lines = [f'{self.name}{{quantile="{q}"}} {self.quantile(q):.6g}' for q in self.QUANTILES]
+        if self.count:
+            lines.append(f'{self.name}_max {format_value(self.max)}')
+        lines += [f'{self.name}_sum {format_value(self.sum)}', f'{self.name}_count {self.count}']
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики оркестратора: текстовый снимок в формате Prometheus по HTTP и в журнал."""
+
+    def __init__(self, prefix: str = '') -> None:
+        self.prefix = prefix
+        self._metrics: Dict[str, Union[Counter, Gauge, Histogram]] = {}
+
+    def _add(self, metric):
+        metric.name = self.prefix + metric.name
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str = '', fn: Optional[Callable[[], Number]] = None) -> Counter:
+        return self._add(Counter(name, help, fn))
+
+    def gauge(self, name: str, help: str = '', fn: Optional[Callable[[], Number]] = None) -> Gauge:
+        return self._add(Gauge(name, help, fn))
+
+    def histogram(self, name: str, help: str = '', precision: int = 7) -> Histogram:
+        return self._add(Histogram(name, help, precision))
+
+    def __getitem__(self, name: str):
+        return self._metrics[self.prefix + name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            kind = type(metric).__name__.lower()
+            if metric.help:
+                lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {"summary" if kind == "histogram" else kind}')
+            try:
+                lines += metric.render()
+            except Exception as e:
+                # Сломанная функция одного показателя не должна ломать весь снимок
+                log.warning(f"Metric {metric.name} failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            if request.split()[1:2] == [b'/metrics'] or request.split()[1:2] == [b'/']:
+                status, body = '200 OK', self.render().encode()
+            else:
+                status, body = '404 Not Found', b''
+            writer.write(
+                f'HTTP/1.0 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9100) -> asyncio.AbstractServer:
+        server = await asyncio.start_server(self._handle, host, port)
+        log.info(f"Metrics are served at http://{host}:{port}/metrics")
+        return server
+
+    async def log_snapshots(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            log.info(f"Metrics snapshot:\n{self.render()}")
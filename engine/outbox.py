@@ -0,0 +1,372 @@
+import asyncio
+import os
+import struct
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from logging import getLogger
+
+log = getLogger(__name__)
+
+INDEX_MAGIC = b'OBOX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHH')
+# head segment, head offset, tail segment, tail offset, unread records
+INDEX_ENTRY = struct.Struct('<IQIQQ')
+# payload length, crc32 of deadline + payload, deadline (nan if none)
+RECORD_HEADER = struct.Struct('<IId')
+NO_DEADLINE = float('nan')
+
+
+class OutboxRecord(NamedTuple):
+    priority: int
+    deadline: Optional[float]
+    payload: bytes
+    # Ключ устройства-источника и время приема (time.monotonic), только в памяти (в журнал не пишутся)
+    device: Optional[str] = None
+    received: Optional[float] = None
+
+
+def encode_record(payload: bytes, deadline: Optional[float]) -> bytes:
+    deadline = NO_DEADLINE if deadline is None else float(deadline)
+    crc = zlib.crc32(payload, zlib.crc32(struct.pack('<d', deadline)))
+    return RECORD_HEADER.pack(len(payload), crc, deadline) + payload
+
+
+def read_record(f) -> Optional[tuple]:
+    # (deadline, payload) или None на конце файла / оборванной или испорченной записи
+    header = f.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+    length, crc, deadline = RECORD_HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload, zlib.crc32(struct.pack('<d', deadline))) != crc:
+        return None
+    return (None if deadline != deadline else deadline), payload
+
+
+class _Log:
+    # Журнал одного приоритета: сегменты seq.log, запись в конец, чтение с головы
+
+    def __init__(self, directory: Path, priority: int) -> None:
+        self.directory = directory
+        self.priority = priority
+        self.segments = deque()
+        self.head = (0, 0)
+        self.tail = (0, 0)
+        self.count = 0
+
+        # Прочитанные сегменты, удаляются после фиксации индекса
+        self.consumed = []
+        self.writer = None
+        self.reader = None
+        self.pending = bytearray()
+        self.dirty = False
+
+    def path(self, segment: int) -> Path:
+        return self.directory / f'{self.priority}-{segment:08d}.log'
+
+    def open_writer(self) -> None:
+        segment, offset = self.tail
+        self.writer = open(self.path(segment), 'ab', buffering=0)
+        if self.writer.tell() != offset:
+            self.writer.truncate(offset)
+            self.writer.seek(offset)
+        if not self.segments or self.segments[-1] != segment:
+            self.segments.append(segment)
+
+    def write_pending(self) -> None:
+        if self.pending:
+            self.writer.write(self.pending)
+            self.pending = bytearray()
+
+    def open_reader(self) -> None:
+        segment, offset = self.head
+        self.reader = open(self.path(segment), 'rb')
+        self.reader.seek(offset)
+
+
+def orphaned_slices(root: Path, worker: int, workers: int) -> List[Path]:
+    # Части очереди без процесса-владельца после смены числа процессов: общий каталог (запуск
+    # без частей) достается процессу 0, worker-K при K >= workers - процессу K % workers
+    root = Path(root)
+    slices = []
+    if worker == 0 and ((root / 'index').is_file() or any(root.glob('*-*.log'))):
+        slices.append(root)
+    for path in sorted(root.glob('worker-*')):
+        number = path.name[len('worker-'):]
+        if path.is_dir() and number.isdigit() and int(number) >= workers and int(number) % workers == worker:
+            slices.append(path)
+    return slices
+
+
+class Outbox:
+    """Персистентная очередь исходящих сообщений с приоритетами.
+
+    Каждый приоритет (0 - самый срочный) пишется в свой журнал из сегментов только в конец:
+    запись - длина, CRC32, срок доставки и тело. Компактный индекс (голова, хвост и число
+    непрочитанных записей каждого журнала) заменяется атомарно при групповой фиксации:
+    записи, накопленные за commit_interval, сбрасываются одним fsync в отдельном потоке.
+    При запуске достаточно прочитать индекс и проверить записи после зафиксированного хвоста.
+    В памяти хранятся только позиции и счетчики, а не сами сообщения.
+
+    Сообщение считается доставленным, когда фиксация прошла после take: после сбоя
+    взятые, но не зафиксированные сообщения будут отправлены повторно.
+    """
+
+    def __init__(self, path: Path, priorities: int = 4, segment_size: int = 64 * 1024 * 1024,
+                 commit_interval: float = 0.05) -> None:
+        self.path = Path(path)
+        self.priorities = priorities
+        self.segment_size = segment_size
+        self.commit_interval = commit_interval
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._logs = [_Log(self.path, priority) for priority in range(priorities)]
+        self._retired = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._committed: Optional[asyncio.Future] = None
+        self._dirty: Optional[asyncio.Event] = None
+
+        self._recover()
+
+    @property
+    def index_path(self) -> Path:
+        return self.path / 'index'
+
+    def __len__(self) -> int:
+        return sum(log_.count for log_ in self._logs)
+
+    def ready(self) -> int:
+        return len(self)
+
+    def empty(self) -> bool:
+        return not len(self)
+
+    def stats(self) -> Dict[str, int]:
+        return {'depth': len(self)}
+
+    def _recover(self) -> None:
+        found = {}
+        for file in self.path.glob('*-*.log'):
+            priority, segment = file.stem.split('-')
+            found.setdefault(int(priority), []).append(int(segment))
+
+        entries = None
+        if self.index_path.is_file():
+            data = self.index_path.read_bytes()
+            magic, version, priorities = INDEX_HEADER.unpack_from(data)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION or priorities != self.priorities:
+                raise ValueError(f"{self.index_path} is not a compatible outbox index")
+            entries = [INDEX_ENTRY.unpack_from(data, INDEX_HEADER.size + k * INDEX_ENTRY.size)
+                       for k in range(priorities)]
+
+        for log_ in self._logs:
+            segments = sorted(found.get(log_.priority, []))
+            if entries is not None:
+                head_segment, head_offset, tail_segment, tail_offset, count = entries[log_.priority]
+            else:
+                first = segments[0] if segments else 0
+                head_segment, head_offset, tail_segment, tail_offset, count = first, 0, first, 0, 0
+
+            for segment in segments:
+                if segment < head_segment:
+                    # Сегмент прочитан до сбоя, но не успел удалиться
+                    log_.path(segment).unlink()
+            log_.head = (head_segment, head_offset)
+            log_.count = count
+
+            # Записи после зафиксированного хвоста: дописаны до сбоя, но без индекса
+            log_.tail = (tail_segment, tail_offset)
+            recovered = 0
+            for segment in [segment for segment in segments if segment >= tail_segment]:
+                offset = tail_offset if segment == tail_segment else 0
+                with open(log_.path(segment), 'rb') as f:
+                    f.seek(offset)
+                    while read_record(f) is not None:
+                        recovered += 1
+                        offset = f.tell()
+                    size = os.fstat(f.fileno()).st_size
+                log_.tail = (segment, offset)
+                if offset < size:
+                    log.warning(f"Outbox {log_.path(segment)}: broken record at {offset}, {size - offset} bytes dropped")
+                    for later in [later for later in segments if later > segment]:
+                        log_.path(later).unlink()
+                    break
+            log_.segments = deque(segment for segment in segments if head_segment <= segment < log_.tail[0])
+            log_.count += recovered
+            if recovered:
+                log.info(f"Outbox priority {log_.priority}: {recovered} records recovered after the index")
+
+            log_.open_writer()
+            log_.open_reader()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._dirty = asyncio.Event()
+
+    def append(self, payload, priority: int = 0, deadline: Optional[float] = None, device: Optional[str] = None,
+               received: Optional[float] = None) -> None:
+        # Запись становится устойчивой при следующей групповой фиксации; device и received не сохраняются
+        if isinstance(payload, str):
+            payload = payload.encode()
+        priority = min(max(int(priority), 0), self.priorities - 1)
+        log_ = self._logs[priority]
+        record = encode_record(payload, deadline)
+
+        segment, offset = log_.tail
+        if offset and offset + len(record) > self.segment_size:
+            log_.write_pending()
+            self._retired.append(log_.writer)
+            log_.tail = (segment + 1, 0)
+            log_.open_writer()
+            segment, offset = log_.tail
+        log_.pending += record
+        log_.tail = (segment, offset + len(record))
+        log_.count += 1
+        log_.dirty = True
+
+        if self._dirty is not None:
+            self._dirty.set()
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def put(self, payload, priority: int = 0, deadline: Optional[float] = None) -> None:
+        # append с ожиданием fsync
+        self.append(payload, priority, deadline)
+        if self._committed is None or self._committed.done():
+            self._committed = self._loop.create_future()
+        await asyncio.shield(self._committed)
+
+    async def wait(self) -> None:
+        while not len(self):
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def take(self, limit: int) -> List[OutboxRecord]:
+        # До limit записей, сначала самые срочные; голова сдвигается в индексе при следующей фиксации
+        records = []
+        for log_ in self._logs:
+            if log_.count:
+                log_.write_pending()
+            while log_.count and len(records) < limit:
+                segment, offset = log_.head
+                record = read_record(log_.reader)
+                if record is None:
+                    # Конец сегмента: переходим к следующему
+                    log_.reader.close()
+                    log_.consumed.append(log_.segments.popleft())
+                    log_.head = (log_.segments[0] if log_.segments else log_.tail[0], 0)
+                    log_.open_reader()
+                    continue
+                log_.head = (segment, log_.reader.tell())
+                log_.count -= 1
+                log_.dirty = True
+                records.append(OutboxRecord(log_.priority, *record))
+            if len(records) >= limit:
+                break
+        if records and self._dirty is not None:
+            self._dirty.set()
+        return records
+
+    def _index(self) -> bytes:
+        return INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.priorities) + b''.join(
+            INDEX_ENTRY.pack(*log_.head, *log_.tail, log_.count) for log_ in self._logs
+        )
+
+    def _sync(self, files: list, index: bytes) -> None:
+        for f in files:
+            os.fsync(f.fileno())
+        temporary = self.index_path.with_suffix('.tmp')
+        with open(temporary, 'wb') as f:
+            f.write(index)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.index_path)
+
+    async def commit(self) -> None:
+        # Групповая фиксация: один fsync на все записи с прошлой фиксации
+        files = list(self._retired)
+        retired, self._retired = self._retired, []
+        for log_ in self._logs:
+            if log_.dirty:
+                log_.write_pending()
+                files.append(log_.writer)
+                log_.dirty = False
+        committed, self._committed = self._committed, None
+        consumed = []
+        for log_ in self._logs:
+            consumed += [log_.path(segment) for segment in log_.consumed]
+            log_.consumed = []
+        sync = self._loop.run_in_executor(self._executor, self._sync, files, self._index())
+        try:
+            await asyncio.shield(sync)
+        except asyncio.CancelledError:
+            # Остановка движка: начатая фиксация доводится до конца, иначе прочитанные сегменты не удалятся
+            await sync
+            self._finish_commit(retired, consumed, committed)
+            raise
+        self._finish_commit(retired, consumed, committed)
+
+    @staticmethod
+    def _finish_commit(retired: list, consumed: List[Path], committed: Optional[asyncio.Future]) -> None:
+        for f in retired:
+            f.close()
+        # Прочитанные сегменты больше не нужны после записи индекса
+        for path in consumed:
+            path.unlink()
+        if committed is not None and not committed.done():
+            committed.set_result(None)
+
+    async def run(self) -> None:
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.commit_interval)
+            self._dirty.clear()
+            await self.commit()
+
+    def sync(self) -> None:
+        # Синхронная фиксация вне цикла событий
+        for log_ in self._logs:
+            log_.write_pending()
+            log_.dirty = False
+        self._sync([log_.writer for log_ in self._logs] + self._retired, self._index())
+
+    def adopt(self, path: Path, batch: int = 10000) -> int:
+        """Перенос всех записей другой очереди в эту; та очередь затем удаляется.
+
+        Записи фиксируются здесь до удаления источника: сбой посередине приводит к повторной
+        отправке, а не к потере.
+        """
+        source = Outbox(path, self.priorities, self.segment_size)
+        moved = 0
+        while True:
+            records = source.take(batch)
+            if not records:
+                break
+            for record in records:
+                self.append(record.payload, record.priority, record.deadline)
+            moved += len(records)
+        self.sync()
+        source.close()
+        for file in [source.index_path, *source.path.glob('*-*.log')]:
+            file.unlink()
+        if not any(source.path.iterdir()):
+            source.path.rmdir()
+        return moved
+
+    def close(self) -> None:
+        self.sync()
+        for f in [log_.writer for log_ in self._logs] + [log_.reader for log_ in self._logs] + self._retired:
+            f.close()
+        self._retired = []
+        self._executor.shutdown()
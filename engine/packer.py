@@ -0,0 +1,206 @@
+import asyncio
+import struct
+import time
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from logging import getLogger
+
+from engine.outbox import OutboxRecord
+
+log = getLogger(__name__)
+
+# Максимальный размер сообщения SBD (Mobile Originated), байт
+SBD_MAX_SIZE = 340
+# Заголовок кадра: длина (15 бит) и флаг продолжения в старшем бите
+FRAME_HEADER = struct.Struct('>H')
+CONTINUATION = 0x8000
+
+
+def frame(payload: bytes, continued: bool = False) -> bytes:
+    return FRAME_HEADER.pack(len(payload) | (CONTINUATION if continued else 0)) + payload
+
+
+def _pack(payloads: List[bytes], max_size: int = SBD_MAX_SIZE) -> Tuple[List[bytearray], List[List[int]]]:
+    # Контейнеры и номера сообщений (в payloads), попавших в каждый из них
+    capacity = max_size - FRAME_HEADER.size
+    containers = []
+    members = []
+    items = []
+    for k, payload in enumerate(payloads):
+        if len(payload) <= capacity:
+            items.append(k)
+            continue
+        for offset in range(0, len(payload) - capacity, capacity):
+            containers.append(bytearray(frame(payload[offset:offset + capacity], continued=True)))
+            members.append([k])
+        tail = len(payload) - (len(payload) - 1) // capacity * capacity
+        containers.append(bytearray(frame(payload[-tail:])))
+        members.append([k])
+
+    for k in sorted(items, key=lambda k: len(payloads[k]), reverse=True):
+        size = len(payloads[k]) + FRAME_HEADER.size
+        for container, indices in zip(containers, members):
+            if len(container) + size <= max_size:
+                container += frame(payloads[k])
+                indices.append(k)
+                break
+        else:
+            containers.append(bytearray(frame(payloads[k])))
+            members.append([k])
+    return containers, members
+
+
+def pack_containers(payloads: List[bytes], max_size: int = SBD_MAX_SIZE) -> List[bytearray]:
+    """Раскладка сообщений по контейнерам max_size байт (first fit decreasing).
+
+    Сообщение, не помещающееся в один контейнер, режется на полные фрагменты с флагом
+    продолжения, а его хвост открывает следующий контейнер, поэтому фрагменты одного
+    сообщения всегда идут подряд. Остальные сообщения раскладываются по убыванию длины
+    в первый контейнер, где хватает места, в том числе после хвостов.
+    """
+    return _pack(payloads, max_size)[0]
+
+
+def unpack_containers(containers: List[bytes]) -> List[bytes]:
+    # Обратная операция на приемной стороне: контейнеры в порядке отправки
+    payloads = []
+    fragments = bytearray()
+    for container in containers:
+        offset = 0
+        while offset + FRAME_HEADER.size <= len(container):
+            header, = FRAME_HEADER.unpack_from(container, offset)
+            length = header & ~CONTINUATION
+            offset += FRAME_HEADER.size
+            fragments += container[offset:offset + length]
+            offset += length
+            if not header & CONTINUATION:
+                payloads.append(bytes(fragments))
+                fragments = bytearray()
+    return payloads
+
+
+class _Pending(NamedTuple):
+    payload: bytes
+    deadline: Optional[float]
+    # Время приема (time.monotonic, для измерения задержки) и постановки в упаковщик (часы упаковщика)
+    received: Optional[float]
+    added: float
+    device: Optional[str] = None
+
+
+class ContainerPacker:
+    """Накопление сообщений и упаковка в контейнеры SBD отдельно для каждого приоритета.
+
+    Контейнеры собираются, когда накоплено flush_containers контейнеров данных (наименее
+    заполненный контейнер из мелких сообщений без срока доставки при этом откладывается до
+    следующей сборки), или когда самое старое сообщение ждет дольше max_age секунд, или
+    подходит срок доставки одного из сообщений. Срок доставки контейнера - самый ранний из
+    сроков его сообщений.
+    """
+
+    def __init__(self, max_size: int = SBD_MAX_SIZE, max_age: float = 10.0, flush_containers: int = 1,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.max_size = max_size
+        self.max_age = max_age
+        self.flush_size = max_size * flush_containers
+        self._clock = clock
+        # priority -> (сообщения, байт с заголовками)
+        self._pending: Dict[int, Tuple[List[_Pending], int]] = {}
+        self._changed = asyncio.Event()
+
+        self.records = 0
+        self.containers = 0
+        self.packed_bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(records) for records, _ in self._pending.values())
+
+    def fill_ratio(self) -> float:
+        # Средняя заполненность отправленных контейнеров
+        return self.packed_bytes / (self.containers * self.max_size) if self.containers else 0.0
+
+    def add(self, payload, priority: int = 0, deadline: Optional[float] = None,
+            received: Optional[float] = None, device: Optional[str] = None) -> List[OutboxRecord]:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        records, size = self._pending.get(priority, ([], 0))
+        records.append(_Pending(payload, deadline, received, self._clock(), device))
+        size += len(payload) + FRAME_HEADER.size
+        self._pending[priority] = (records, size)
+        if len(records) == 1 or deadline is not None:
+            # Поменялся момент ближайшей сборки по времени
+            self._changed.set()
+        if size >= self.flush_size:
+            return self.flush(priority, hold_back=True)
+        return []
+
+    def flush(self, priority: int, hold_back: bool = False) -> List[OutboxRecord]:
+        records, _ = self._pending.pop(priority)
+        containers, members = _pack([record.payload for record in records], self.max_size)
+
+        capacity = self.max_size - FRAME_HEADER.size
+        if hold_back and len(containers) > 1:
+            # Недозаполненный контейнер из мелких сообщений ждет следующей сборки, но не сообщения со сроком
+            candidates = [
+                k for k, indices in enumerate(members)
+                if all(len(records[i].payload) <= capacity and records[i].deadline is None for i in indices)
+            ]
+            if candidates:
+                k = min(candidates, key=lambda k: len(containers[k]))
+                containers.pop(k)
+                rest = [records[i] for i in sorted(members.pop(k))]
+                self._pending[priority] = (rest, sum(len(record.payload) + FRAME_HEADER.size for record in rest))
+
+        result = []
+        for container, indices in zip(containers, members):
+            deadlines = [records[i].deadline for i in indices if records[i].deadline is not None]
+            received = [records[i].received for i in indices if records[i].received is not None]
+            # Контейнер одного устройства сохраняет его ключ (для coalesce_per_device), смешанный - нет
+            devices = {records[i].device for i in indices}
+            device = devices.pop() if len(devices) == 1 else None
+            result.append(OutboxRecord(
+                priority, min(deadlines, default=None), bytes(container), device, min(received, default=None),
+            ))
+        self.records += len({i for indices in members for i in indices})
+        self.containers += len(containers)
+        self.packed_bytes += sum(len(container) for container in containers)
+        return result
+
+    def flush_all(self) -> List[OutboxRecord]:
+        return [container for priority in sorted(self._pending) for container in self.flush(priority)]
+
+    def due(self, priority: int) -> float:
+        records, _ = self._pending[priority]
+        # Сообщения идут в порядке поступления, и отложенные тоже
+        return min([records[0].added + self.max_age, *(record.deadline for record in records if record.deadline is not None)])
+
+    def next_flush(self) -> Optional[float]:
+        return min((self.due(priority) for priority in self._pending), default=None)
+
+    def expire(self) -> List[OutboxRecord]:
+        now = self._clock()
+        return [
+            container
+            for priority in sorted(self._pending) if self.due(priority) <= now
+            for container in self.flush(priority)
+        ]
+
+    async def run(self, sink: Callable[[List[OutboxRecord]], None], speed: float = 1.0) -> None:
+        # Сборка по времени: сон до ближайшего срока, пробуждение при появлении более раннего
+        while True:
+            self._changed.clear()
+            due = self.next_flush()
+            if due is None:
+                await self._changed.wait()
+                continue
+            delay = (due - self._clock()) / speed
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            containers = self.expire()
+            if containers:
+                sink(containers)
@@ -0,0 +1,67 @@
+import asyncio
+
+from typing import Callable, Optional
+
+from logging import getLogger
+
+from engine.dispatcher import Dispatcher
+from orbital.contact_plan import ContactWindow
+
+log = getLogger(__name__)
+
+
+class TransmissionScheduler:
+    """Открывает шлюз отправки на время предсказанных окон связи.
+
+    Между окнами сообщения копятся в очереди; на восходе спутника шлюз открывается и
+    накопленное уходит пачками по приоритету и сроку. Ожидание - сон ровно до восхода или
+    захода (с поправкой на ускорение симуляции), без опроса.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, next_window: Callable[[float], Optional[ContactWindow]],
+                 clock: Callable[[], float], speed: float = 1.0, guard: float = 0.0, retry: float = 900) -> None:
+        self._dispatcher = dispatcher
+        # До первого окна сообщения только копятся
+        self._dispatcher.close()
+        self._next_window = next_window
+        self._clock = clock
+        self._speed = speed
+        # Отступ от восхода и захода, секунды: на краях окна спутник низко над горизонтом
+        self.guard = guard
+        # Через сколько секунд снова искать окно, если прогноза пока нет
+        self.retry = retry
+        self.window: Optional[ContactWindow] = None
+        self.windows = 0
+
+    async def _sleep_until(self, t: float) -> None:
+        await asyncio.sleep(max(t - self._clock(), 0) / self._speed)
+
+    async def run(self) -> None:
+        while True:
+            now = self._clock()
+            window = self._next_window(now)
+            if window is None:
+                self.window = None
+                self._dispatcher.close()
+                await asyncio.sleep(self.retry / self._speed)
+                continue
+
+            rise, set_ = window.rise + self.guard, window.set - self.guard
+            if set_ <= now:
+                # Окно короче двойного отступа или уже заканчивается
+                self._dispatcher.close()
+                await self._sleep_until(window.set)
+                continue
+            if rise > now:
+                self.window = None
+                self._dispatcher.close()
+                await self._sleep_until(rise)
+                continue
+
+            if self.window != window:
+                self.windows += 1
+                log.info(f"Contact window with {window.satellite} until {window.set:.0f}, "
+                         f"{self._dispatcher.pending()} messages queued")
+            self.window = window
+            self._dispatcher.open()
+            await self._sleep_until(set_)
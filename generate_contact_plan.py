@@ -0,0 +1,71 @@
+import argparse
+import pathlib
+import time
+
+from typing import Optional
+
+from skyfield.api import load
+
+from common.utils import load_yaml, timer_func
+from engine.engine import EngineConfig
+from orbital.catalog import load_catalog
+from orbital.contact_plan import build_contact_plan, catalog_satellites, ContactPlan
+from orbital.passes import find_passes_parallel
+from orbital.planes import PlanePruner, find_windows_pruned, load_planes
+from orbital.propagator import ConstellationPropagator, time_grid
+from orbital.visibility import find_windows
+
+
+@timer_func('CONTACT PLAN BUILT ({} sec)')
+def generate_contact_plan(config: EngineConfig, catalog_path: pathlib.Path, start: float, days: float,
+                          altitude_degrees: float, workers: int = 1, step: float = 0,
+                          planes_path: Optional[pathlib.Path] = None) -> ContactPlan:
+    lat, lon, elevation = config.observer
+    if step and planes_path:
+        # Пропагируются только спутники плоскостей, трасса которых проходит рядом в данный час
+        catalog = load_catalog(catalog_path)
+        pruner = PlanePruner(load_planes(planes_path), catalog)
+        passes = find_windows_pruned(
+            pruner, catalog, lat, lon, elevation / 1000, start, days * 86400, step, mask=altitude_degrees, clip=False,
+        )
+        return ContactPlan.from_passes(passes)
+
+    if step:
+        # Видимость по геометрии прямой видимости на сетке времени, все спутники сразу
+        ephemeris = ConstellationPropagator.from_catalog(catalog_path).propagate(time_grid(start, days * 86400, step))
+        return ContactPlan.from_passes(find_windows(ephemeris, lat, lon, elevation / 1000, altitude_degrees))
+
+    if workers > 1:
+        passes = find_passes_parallel(
+            str(catalog_path), lat, lon, elevation, start, start + days * 86400, altitude_degrees, max_workers=workers
+        )
+        return ContactPlan.from_passes(passes)
+
+    satellites = catalog_satellites(load_catalog(catalog_path), load.timescale())
+    return build_contact_plan(satellites, lat, lon, elevation, start, days, altitude_degrees)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute satellite contact windows for the engine position')
+    parser.add_argument('--config', '-c', type=str, required=True, help='Path to engine configuration file')
+    parser.add_argument('--days', '-d', type=float, default=1, help='Planning horizon in days')
+    parser.add_argument('--start', type=float, default=None, help='Unix timestamp of the plan start (now by default)')
+    parser.add_argument('--altitude', '-a', type=float, default=None, help='Minimum elevation of a window, degrees (elevation_mask from config by default)')
+    parser.add_argument('--step', type=float, default=0, help='Use the vectorized SGP4 grid with this step in seconds instead of find_events')
+    parser.add_argument('--planes', type=str, default=None, help='Orbital planes file (planes from config by default); with --step, skip planes out of reach')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of processes for the pass search')
+    parser.add_argument('--output', '-o', type=str, default=None, help='Contact plan file (contact_plan from config by default)')
+
+    args = parser.parse_args()
+
+    config = EngineConfig.parse_obj(load_yaml(pathlib.Path(args.config).resolve()))
+    catalog_path = pathlib.Path('data') / f'{config.operation_group}.{config.data_format}'
+    output = pathlib.Path(args.output or config.contact_plan or 'contact_plan.bin')
+
+    altitude = config.elevation_mask if args.altitude is None else args.altitude
+    planes = args.planes or config.planes
+    plan = generate_contact_plan(
+        config, catalog_path, args.start or time.time(), args.days, altitude, args.workers, args.step, planes,
+    )
+    plan.save(output)
+    print(f'{len(plan)} windows saved to {output}')
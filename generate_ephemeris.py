@@ -0,0 +1,39 @@
+import argparse
+import pathlib
+import time
+
+from common.utils import load_yaml, timer_func
+from engine.engine import EngineConfig
+from orbital.chebyshev import ChebyshevEphemeris
+from orbital.propagator import ConstellationPropagator
+
+
+@timer_func('EPHEMERIS FITTED ({} sec)')
+def generate_ephemeris(catalog_path: pathlib.Path, start: float, hours: float, segment: float,
+                       degree: int, tolerance: float) -> ChebyshevEphemeris:
+    propagator = ConstellationPropagator.from_catalog(catalog_path)
+    return ChebyshevEphemeris.fit(propagator, start, hours * 3600, segment, degree, tolerance)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit a Chebyshev ephemeris cache for the engine')
+    parser.add_argument('--config', '-c', type=str, required=True, help='Path to engine configuration file')
+    parser.add_argument('--hours', type=float, default=24, help='Cached interval in hours')
+    parser.add_argument('--start', type=float, default=None, help='Unix timestamp of the interval start (now by default)')
+    parser.add_argument('--segment', type=float, default=900, help='Segment length in seconds')
+    parser.add_argument('--degree', type=int, default=6, help='Initial polynomial degree')
+    parser.add_argument('--tolerance', type=float, default=0.001, help='Maximum position error, km')
+    parser.add_argument('--output', '-o', type=str, default=None, help='Cache file (ephemeris_cache from config by default)')
+
+    args = parser.parse_args()
+
+    config = EngineConfig.parse_obj(load_yaml(pathlib.Path(args.config).resolve()))
+    catalog_path = pathlib.Path('data') / f'{config.operation_group}.{config.data_format}'
+    output = pathlib.Path(args.output or config.ephemeris_cache or 'ephemeris.bin')
+
+    ephemeris = generate_ephemeris(
+        catalog_path, args.start or time.time(), args.hours, args.segment, args.degree, args.tolerance
+    )
+    ephemeris.save(output)
+    print(f'{len(ephemeris.names)} satellites, degree {ephemeris.degree}, '
+          f'max error {ephemeris.max_error * 1000:.3f} m saved to {output}')
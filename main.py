@@ -1,3 +1,5 @@
+import argparse
+import calendar
 import json
 import logging
 import os
@@ -11,9 +13,14 @@ from collections import defaultdict
 from sgp4.api import Satrec, jday
 from sgp4 import omm
 from skyfield.api import load, EarthSatellite, wgs84
+from scipy.optimize import minimize_scalar
 from math import radians, sin, cos, sqrt, atan2
 
 from config import ROOT_DIR
+from orbital import geometry
+from orbital.catalog import load_catalog
+from orbital.planes import PlanePruner, load_planes
+from orbital.propagator import ConstellationPropagator, time_grid
 
 
 # Calculate distance between two points
@@ -68,7 +75,7 @@ def import_data_tle(path):
 def import_data_csv(path):
     if os.path.isfile(path):
         with open(path, 'r') as read_file:
-            data_csv = next(omm.parse_csv(read_file))
+            data_csv = list(omm.parse_csv(read_file))
         return data_csv
     return None
 
@@ -79,7 +86,140 @@ def save_data_json(path, data) -> None:
         json.dump(data, f)
 
 
+def find_closest_approach_loop(satellite, t0, position, duration=86400):
+    # Reference implementation: one propagation per second
+    best = None
+    t = t0
+    k = 0
+    while k < duration:
+        t += timedelta(seconds=1)
+        geocentric = satellite.at(t)
+        lat, lon = wgs84.latlon_of(geocentric)
+
+        satellite_distance = haversine_distance(position[0], position[1], lat.degrees, lon.degrees)
+        dt = t.utc_datetime().timestamp()
+
+        if best is None or best[0] > satellite_distance:
+            best = [satellite_distance, dt, lat.degrees, lon.degrees]
+
+        k += 1
+
+    return best
+
+
+def find_closest_approach_batch(satellite, t0, position, duration=86400, step=1):
+    # Same grid as the loop (t0 + 1s ... t0 + duration), evaluated with one Time array
+    offsets = np.arange(step, duration + step, step)
+    t = t0 + offsets / 86400
+    geocentric = satellite.at(t)
+    lat, lon = wgs84.latlon_of(geocentric)
+
+    distances = geometry.haversine_distance(position[0], position[1], lat.degrees, lon.degrees)
+    # argmin returns the first minimum, as the strict comparison in the loop does
+    i = int(np.argmin(distances))
+
+    return [float(distances[i]), t[i].utc_datetime().timestamp(), float(lat.degrees[i]), float(lon.degrees[i])]
+
+
+def ground_distance(satellite, t0, offsets, position):
+    # Ground distance from the terminal at t0 + offsets (seconds)
+    t = t0 + np.asarray(offsets) / 86400
+    lat, lon = wgs84.latlon_of(satellite.at(t))
+    distances = geometry.haversine_distance(position[0], position[1], lat.degrees, lon.degrees)
+    return distances, t, lat.degrees, lon.degrees
+
+
+def find_closest_approach_refined(satellite, t0, position, duration=86400, coarse_step=300, tolerance=0.01):
+    # Coarse grid over the whole window: every local minimum is a candidate
+    offsets = np.append(np.arange(1, duration, coarse_step, dtype=float), duration)
+    distances, _, _, _ = ground_distance(satellite, t0, offsets, position)
+
+    candidates = [
+        i for i in range(len(offsets))
+        if (i == 0 or distances[i] <= distances[i - 1])
+        and (i == len(offsets) - 1 or distances[i] <= distances[i + 1])
+    ]
+
+    best = None
+    for i in candidates:
+        # Minimum lies between the neighbouring coarse samples
+        lower = offsets[max(i - 1, 0)]
+        upper = offsets[min(i + 1, len(offsets) - 1)]
+        result = minimize_scalar(
+            lambda x: float(ground_distance(satellite, t0, x, position)[0]),
+            bounds=(lower, upper),
+            method='bounded',
+            options={'xatol': tolerance},
+        )
+        if best is None or result.fun < best[0]:
+            best = [result.fun, result.x]
+
+    distance, t, lat, lon = ground_distance(satellite, t0, best[1], position)
+    return [float(distance), t.utc_datetime().timestamp(), float(lat), float(lon)]
+
+
+def find_closest_approach_constellation(propagator, start, position, duration=86400, step=1, times=None):
+    # All satellites in one SatrecArray call; start is a unix timestamp
+    ephemeris = propagator.propagate(time_grid(start, duration, step) if times is None else times)
+    distances = geometry.haversine_distance(position[0], position[1], ephemeris.lat, ephemeris.lon)
+    distances[ephemeris.errors != 0] = np.inf
+    best = np.argmin(distances, axis=1)
+
+    return {
+        name: [
+            float(distances[k, i]),
+            float(ephemeris.times[i]),
+            float(ephemeris.lat[k, i]),
+            float(ephemeris.lon[k, i]),
+        ]
+        for k, (name, i) in enumerate(zip(ephemeris.names, best))
+    }
+
+
+def find_closest_approach_pruned(pruner, catalog, start, position, duration=86400, step=1, slice_length=1800,
+                                 margin=0.5):
+    # The ground distance inside a slice is at least the distance from the terminal to the great circle
+    # of the ground track, so slices are scanned from the most promising one and the rest are skipped
+    # as soon as their bound exceeds the best distance found (margin covers geodetic vs geocentric latitude)
+    bounds, offsets = pruner.slice_offsets(position[0], position[1], start, start + duration, slice_length)
+    lower = geometry.EARTH_RADIUS * np.radians(np.maximum(offsets - margin - 60 / 240, 0))
+    grid = time_grid(start, duration, step)
+
+    result = {}
+    for p, (plane, names) in enumerate(pruner.planes.items()):
+        propagator = ConstellationPropagator({names[0]: catalog[names[0]]})
+        best = None
+        for k in np.argsort(lower[p]):
+            if best is not None and lower[p, k] >= best[0]:
+                break
+            times = grid[(grid > bounds[k]) & (grid <= bounds[k + 1])]
+            candidate = find_closest_approach_constellation(propagator, 0, position, times=times)[names[0]]
+            if best is None or candidate[0] < best[0] or (candidate[0] == best[0] and candidate[1] < best[1]):
+                best = candidate
+        result[names[0]] = best
+
+    return result
+
+
+SEARCH_MODES = {
+    'loop': find_closest_approach_loop,
+    'batch': find_closest_approach_batch,
+    'refine': find_closest_approach_refined,
+}
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find closest approach of Iridium NEXT planes to the terminal')
+    parser.add_argument(
+        '--mode',
+        '-m',
+        type=str,
+        default='batch',
+        choices=[*SEARCH_MODES, 'sgp4', 'pruned'],
+        help='Closest-approach search mode'
+    )
+    args = parser.parse_args()
+
     # log section
     LOG_PATH = os.path.join(ROOT_DIR, 'logs', 'iridium.log')
     WORK_PATH = os.path.join(ROOT_DIR, 'data')
@@ -128,26 +268,27 @@ if __name__ == '__main__':
     eph = load('de421.bsp')
     ts = load.timescale()
 
-    for i in iridium_next_orbitals:
-        k = 0
-        curr_sat = str(iridium_next_orbitals[i][0])
-        satellite = EarthSatellite(iridium_data[curr_sat][0], iridium_data[curr_sat][1])
-        t = ts.utc(year, month, day, hour, minute, second)
-        while k < 86400:
-            t += timedelta(seconds=1)
-            geocentric = satellite.at(t)
-            lat, lon = wgs84.latlon_of(geocentric)
-
-            satellite_distance = haversine_distance(curr_pos[0], curr_pos[1], lat.degrees, lon.degrees)
-            dt = t.utc_datetime().timestamp()
-
-            if not optimal_distance_and_time.get(i):
-                optimal_distance_and_time[i] = [satellite_distance, dt, lat.degrees, lon.degrees]
-            else:
-                if optimal_distance_and_time[i][0] > satellite_distance:
-                    optimal_distance_and_time[i] = [satellite_distance, dt, lat.degrees, lon.degrees]
-
-            k += 1
+    if args.mode == 'pruned':
+        catalog = load_catalog(config_path)
+        planes = load_planes(os.path.join(WORK_PATH, 'iridium_next.orbitals.json'))
+        pruner = PlanePruner(planes, catalog)
+        start = calendar.timegm(simulation_timestamp_gmt)
+        records = find_closest_approach_pruned(pruner, catalog, start, curr_pos)
+        for i in iridium_next_orbitals:
+            optimal_distance_and_time[i] = records[f'IRIDIUM {iridium_next_orbitals[i][0]}']
+    elif args.mode == 'sgp4':
+        planes = {f'IRIDIUM {iridium_next_orbitals[i][0]}': i for i in iridium_next_orbitals}
+        propagator = ConstellationPropagator.from_catalog(config_path, names=list(planes))
+        start = calendar.timegm(simulation_timestamp_gmt)
+        for curr_sat, record in find_closest_approach_constellation(propagator, start, curr_pos).items():
+            optimal_distance_and_time[planes[curr_sat]] = record
+    else:
+        search = SEARCH_MODES[args.mode]
+        for i in iridium_next_orbitals:
+            curr_sat = str(iridium_next_orbitals[i][0])
+            satellite = EarthSatellite(iridium_data[curr_sat][0], iridium_data[curr_sat][1])
+            t = ts.utc(year, month, day, hour, minute, second)
+            optimal_distance_and_time[i] = search(satellite, t, curr_pos)
 
     et = time.time()
 
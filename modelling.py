@@ -2,7 +2,7 @@ from skyfield.api import Topos, load
 from datetime import timedelta
 
 
-def find_iridium_passes(observer_lat, observer_lon, tle_file):
+def find_iridium_passes(observer_lat, observer_lon, tle_file, altitude_degrees=60):
     ts = load.timescale()
     tle_data = load.tle_file(tle_file)
     observer = Topos(latitude_degrees=observer_lat, longitude_degrees=observer_lon)
@@ -10,7 +10,7 @@ def find_iridium_passes(observer_lat, observer_lon, tle_file):
     passes = []
     for satellite in tle_data:
         t0, t1 = ts.now(), ts.now() + timedelta(days=1)
-        t, events = satellite.find_events(observer, t0, t1, altitude_degrees=60)  # 30 градусов как пример
+        t, events = satellite.find_events(observer, t0, t1, altitude_degrees=altitude_degrees)
         rise_time = None
         for ti, event in zip(t, events):
             if event == 0:  # восход
@@ -4,6 +4,8 @@ from scipy.constants import kilo, mega, c
 import matplotlib.pyplot as plt
 import requests
 
+from orbital.link_budget import basic_atmospheric_attenuation
+
 
 # Загрузка TLE данных для спутников Iridium
 def load_tle():
@@ -29,15 +31,6 @@ def satellite_visibility_and_attenuation(observer, tle_data, ts):
     return losses
 
 
-# Простая модель атмосферного затухания
-def basic_atmospheric_attenuation(elevation_angle):
-    # Более сложные модели могут учитывать погодные условия, влажность и другие факторы
-    if elevation_angle > 45:
-        return 0.5  # дБ
-    else:
-        return 1.5  # дБ из-за низкой элевации
-
-
 # Визуализация затухания
 def plot_attenuations(attenuations):
     times = [att[0] for att in attenuations]
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+from logging import getLogger
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+from sgp4 import omm
+from sgp4.api import Satrec, WGS72
+
+log = getLogger(__name__)
+
+CACHE_MAGIC = b'SCAT'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<4sHd20sII')
+CACHE_SUFFIX = '.satcat'
+
+# Days since 1949 Dec 31 00:00 UT, the sgp4init epoch origin
+SGP4_EPOCH_JD = 2433281.5
+
+ELEMENTS_DTYPE = np.dtype([
+    ('satnum', '<i4'),
+    ('epoch', '<f8'),
+    ('bstar', '<f8'),
+    ('ndot', '<f8'),
+    ('nddot', '<f8'),
+    ('ecco', '<f8'),
+    ('argpo', '<f8'),
+    ('inclo', '<f8'),
+    ('mo', '<f8'),
+    ('no_kozai', '<f8'),
+    ('nodeo', '<f8'),
+])
+
+
+def iter_tle(file) -> Iterator[Tuple[str, Satrec]]:
+    # Two- or three-line element sets; the name line is optional
+    name = None
+    line1 = None
+    for line in file:
+        line = line.rstrip()
+        if not line:
+            continue
+        if line.startswith('1 ') and len(line) >= 69:
+            line1 = line
+        elif line.startswith('2 ') and line1 is not None:
+            satrec = Satrec.twoline2rv(line1, line)
+            yield name or str(satrec.satnum), satrec
+            name = line1 = None
+        else:
+            name = line.strip()
+
+
+def iter_omm(records) -> Iterator[Tuple[str, Satrec]]:
+    for fields in records:
+        satrec = Satrec()
+        omm.initialize(satrec, {key: str(value) for key, value in fields.items()})
+        yield fields['OBJECT_NAME'], satrec
+
+
+def iter_records(path: Path) -> Iterator[Tuple[str, Satrec]]:
+    """Streams (name, Satrec) from a TLE, OMM JSON, OMM CSV or OMM XML catalog."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    with path.open('r', encoding='utf-8') as f:
+        if suffix in ('.tle', '.txt'):
+            yield from iter_tle(f)
+        elif suffix == '.json':
+            yield from iter_omm(json.load(f))
+        elif suffix == '.csv':
+            yield from iter_omm(omm.parse_csv(f))
+        elif suffix == '.xml':
+            yield from iter_omm(omm.parse_xml(f))
+        else:
+            raise ValueError(f"Catalog format {suffix} is not supported")
+
+
+def satrec_to_elements(satrec: Satrec) -> tuple:
+    epoch = (satrec.jdsatepoch - SGP4_EPOCH_JD) + satrec.jdsatepochF
+    return (
+        satrec.satnum, epoch, satrec.bstar, satrec.ndot, satrec.nddot, satrec.ecco,
+        satrec.argpo, satrec.inclo, satrec.mo, satrec.no_kozai, satrec.nodeo,
+    )
+
+
+def elements_to_satrec(elements) -> Satrec:
+    satrec = Satrec()
+    satrec.sgp4init(
+        WGS72, 'i', int(elements['satnum']), float(elements['epoch']), float(elements['bstar']),
+        float(elements['ndot']), float(elements['nddot']), float(elements['ecco']), float(elements['argpo']),
+        float(elements['inclo']), float(elements['mo']), float(elements['no_kozai']), float(elements['nodeo']),
+    )
+    return satrec
+
+
+def cache_path(path: Path) -> Path:
+    return path.with_name(f'.{path.name}{CACHE_SUFFIX}')
+
+
+def file_hash(path: Path) -> bytes:
+    with path.open('rb') as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def save_cache(path: Path, mtime: float, digest: bytes, names: list, elements: np.ndarray) -> None:
+    encoded_names = '\n'.join(names).encode('utf-8')
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('wb') as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, mtime, digest, len(encoded_names), len(elements)))
+        f.write(encoded_names)
+        f.write(elements.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_cache(path: Path):
+    data = path.read_bytes()
+    magic, version, mtime, digest, names_size, count = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    offset = CACHE_HEADER.size
+    names = data[offset:offset + names_size].decode('utf-8').split('\n') if count else []
+    elements = np.frombuffer(data, dtype=ELEMENTS_DTYPE, count=count, offset=offset + names_size)
+    return mtime, digest, names, elements
+
+
+def load_catalog(path: Path, use_cache: bool = True) -> Dict[str, Satrec]:
+    """Loads a satellite catalog of any supported format into {name: Satrec}.
+
+    The parsed elements are cached next to the source file. The cache is valid while
+    the source mtime is unchanged, or, if only the mtime changed, while its SHA-1 matches.
+    Repeated names (e.g. debris) get the NORAD id appended.
+    """
+    path = Path(path)
+    mtime = path.stat().st_mtime
+    cached = cache_path(path)
+
+    digest = None
+    if use_cache and cached.is_file():
+        cache = read_cache(cached)
+        if cache is not None:
+            cache_mtime, cache_digest, names, elements = cache
+            if cache_mtime != mtime:
+                digest = file_hash(path)
+            if cache_mtime == mtime or cache_digest == digest:
+                if cache_mtime != mtime:
+                    save_cache(cached, mtime, cache_digest, names, elements)
+                log.debug(f"Catalog {path} loaded from cache ({len(names)} records)")
+                return {name: elements_to_satrec(record) for name, record in zip(names, elements)}
+
+    catalog = {}
+    for name, satrec in iter_records(path):
+        if name in catalog:
+            name = f'{name} #{satrec.satnum}'
+        catalog[name] = satrec
+
+    if use_cache:
+        elements = np.array([satrec_to_elements(satrec) for satrec in catalog.values()], dtype=ELEMENTS_DTYPE)
+        try:
+            save_cache(cached, mtime, digest or file_hash(path), list(catalog), elements)
+        except OSError as e:
+            log.warning(f"Catalog cache {cached} is not writable: {e}")
+
+    return catalog
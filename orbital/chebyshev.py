@@ -0,0 +1,154 @@
+import struct
+import numpy as np
+
+from pathlib import Path
+from typing import List, Union
+
+from numpy.polynomial import chebyshev
+
+from orbital import geometry
+from orbital.propagator import ConstellationPropagator, Ephemeris
+
+MAGIC = b'CHEB'
+VERSION = 1
+HEADER = struct.Struct('<4sHdddIIII')
+
+
+def chebyshev_nodes(degree: int) -> np.ndarray:
+    # Chebyshev points of the first kind on [-1, 1], twice as many as coefficients
+    count = 2 * (degree + 1)
+    return np.cos(np.pi * (np.arange(count) + 0.5) / count)[::-1]
+
+
+class ChebyshevEphemeris:
+    """Piecewise Chebyshev fit of TEME positions, one polynomial per satellite, segment and axis."""
+
+    def __init__(self, names: List[str], start: float, segment: float, coefficients: np.ndarray,
+                 max_error: float) -> None:
+        self.names = names
+        self.start = start
+        self.segment = segment
+        # (n_satellites, n_segments, degree + 1, 3)
+        self.coefficients = coefficients
+        self.max_error = max_error
+
+        self._index = {name: k for k, name in enumerate(names)}
+        self._derivatives = None
+
+    @property
+    def end(self) -> float:
+        return self.start + self.segment * self.coefficients.shape[1]
+
+    @property
+    def degree(self) -> int:
+        return self.coefficients.shape[2] - 1
+
+    @classmethod
+    def fit(cls, propagator: ConstellationPropagator, start: float, duration: float, segment: float = 900,
+            degree: int = 6, tolerance: float = 0.001, max_degree: int = 24) -> 'ChebyshevEphemeris':
+        """Fits the whole constellation, raising the degree until the error is below tolerance (km).
+
+        The error is measured against SGP4 halfway between the fitting nodes of every segment.
+        """
+        segments = int(np.ceil(duration / segment))
+        origins = start + segment * np.arange(segments)
+
+        while True:
+            nodes = chebyshev_nodes(degree)
+            samples = propagator.propagate((origins[:, None] + (nodes + 1) * segment / 2).ravel()).teme
+            samples = samples.reshape(len(propagator), segments, len(nodes), 3)
+            # Same design matrix for every satellite, segment and axis: one pseudo-inverse
+            fit = np.linalg.pinv(chebyshev.chebvander(nodes, degree))
+            coefficients = np.einsum('cn,sgnx->sgcx', fit, samples)
+
+            check = (nodes[:-1] + nodes[1:]) / 2
+            expected = propagator.propagate((origins[:, None] + (check + 1) * segment / 2).ravel()).teme
+            expected = expected.reshape(len(propagator), segments, len(check), 3)
+            actual = np.einsum('nc,sgcx->sgnx', chebyshev.chebvander(check, degree), coefficients)
+            max_error = float(np.linalg.norm(actual - expected, axis=-1).max())
+
+            if max_error <= tolerance or degree >= max_degree:
+                return cls(propagator.names, float(start), float(segment), coefficients, max_error)
+            degree += 2
+
+    def subset(self, names: List[str]) -> 'ChebyshevEphemeris':
+        # The same fit restricted to some of the satellites, without refitting
+        indices = [self._index[name] for name in names]
+        return ChebyshevEphemeris(list(names), self.start, self.segment, self.coefficients[indices], self.max_error)
+
+    def _locate(self, t):
+        t = np.asarray(t, dtype=float)
+        if np.any(t < self.start) or np.any(t > self.end):
+            raise ValueError(f"Time outside of the cached interval [{self.start}, {self.end}]")
+        segment = np.minimum(((t - self.start) // self.segment).astype(int), self.coefficients.shape[1] - 1)
+        tau = 2 * (t - self.start - segment * self.segment) / self.segment - 1
+        return segment, tau
+
+    def position(self, satellite: Union[str, int], t: float) -> tuple:
+        # TEME position (km) of one satellite at one instant: scalar Clenshaw recurrence, no numpy overhead
+        k = self._index[satellite] if isinstance(satellite, str) else satellite
+        offset = t - self.start
+        if not 0 <= offset <= self.end - self.start:
+            raise ValueError(f"Time outside of the cached interval [{self.start}, {self.end}]")
+        segment = min(int(offset // self.segment), self.coefficients.shape[1] - 1)
+        tau = 2 * (offset - segment * self.segment) / self.segment - 1
+        coefficients = self.coefficients[k, segment].tolist()
+
+        x2 = 2 * tau
+        bx = by = bz = 0.0
+        cx = cy = cz = 0.0
+        for ax, ay, az in reversed(coefficients[1:]):
+            bx, cx = ax + x2 * bx - cx, bx
+            by, cy = ay + x2 * by - cy, by
+            bz, cz = az + x2 * bz - cz, bz
+        ax, ay, az = coefficients[0]
+        return ax + tau * bx - cx, ay + tau * by - cy, az + tau * bz - cz
+
+    def positions(self, times: np.ndarray) -> np.ndarray:
+        # TEME positions of all satellites, (n_satellites, n_times, 3)
+        segment, tau = self._locate(times)
+        basis = chebyshev.chebvander(tau, self.degree)
+        return np.einsum('tc,stcx->stx', basis, self.coefficients[:, segment])
+
+    def velocities(self, times: np.ndarray) -> np.ndarray:
+        if self._derivatives is None:
+            self._derivatives = chebyshev.chebder(self.coefficients, axis=2) * (2 / self.segment)
+        segment, tau = self._locate(times)
+        basis = chebyshev.chebvander(tau, self.degree - 1)
+        return np.einsum('tc,stcx->stx', basis, self._derivatives[:, segment])
+
+    def ephemeris(self, times: np.ndarray) -> Ephemeris:
+        # Drop-in replacement for ConstellationPropagator.propagate inside the cached interval
+        times = np.asarray(times, dtype=float)
+        errors = np.zeros((len(self.names), len(times)), dtype=np.uint8)
+        return Ephemeris(self.names, times, self.positions(times), self.velocities(times), errors)
+
+    def geodetic(self, satellite: Union[str, int], t: float):
+        # lat, lon (degrees), height (km)
+        jd, fr = geometry.unix_to_jday(t)
+        ecef = geometry.teme_to_ecef(np.array(self.position(satellite, t)), geometry.gmst(jd, fr))
+        return tuple(float(value) for value in geometry.ecef_to_geodetic(ecef))
+
+    def save(self, path: Path) -> None:
+        names = '\n'.join(self.names).encode('utf-8')
+        n_satellites, n_segments, n_coefficients, _ = self.coefficients.shape
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.start, self.segment, self.max_error,
+                                len(names), n_satellites, n_segments, n_coefficients))
+            f.write(names)
+            f.write(np.ascontiguousarray(self.coefficients, dtype='<f8').tobytes())
+
+    @classmethod
+    def load(cls, path: Path) -> 'ChebyshevEphemeris':
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, start, segment, max_error, names_size, n_satellites, n_segments, n_coefficients = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a Chebyshev ephemeris file")
+        offset = HEADER.size
+        names = data[offset:offset + names_size].decode('utf-8').split('\n')
+        coefficients = np.frombuffer(
+            data, dtype='<f8', count=n_satellites * n_segments * n_coefficients * 3, offset=offset + names_size
+        ).reshape(n_satellites, n_segments, n_coefficients, 3)
+        return cls(names, start, segment, coefficients, max_error)
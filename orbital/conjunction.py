@@ -0,0 +1,152 @@
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from scipy.spatial import cKDTree
+
+from orbital.propagator import ConstellationPropagator
+
+# Upper bound of the relative speed of two LEO objects (head-on), km/s
+MAX_RELATIVE_SPEED = 16.0
+
+# Worker state: both catalogs are parsed once per process by the pool initializer
+_primary = None
+_secondary = None
+_same = None
+
+
+class Conjunction(NamedTuple):
+    tca: float
+    primary: str
+    secondary: str
+    miss_distance: float
+    relative_speed: float
+
+
+def _init_worker(primary_path: str, secondary_path: str) -> None:
+    global _primary, _secondary, _same
+    _primary = ConstellationPropagator.from_catalog(primary_path)
+    _secondary = ConstellationPropagator.from_catalog(secondary_path)
+    _same = same_objects(_primary, _secondary)
+
+
+def same_objects(primary: ConstellationPropagator, secondary: ConstellationPropagator) -> Set[Tuple[int, int]]:
+    # Pairs present in both catalogs (e.g. IRIDIUM 33 itself in the debris catalog) by NORAD number
+    numbers = {satrec.satnum: j for j, satrec in enumerate(secondary.satrecs)}
+    return {(i, numbers[satrec.satnum]) for i, satrec in enumerate(primary.satrecs) if satrec.satnum in numbers}
+
+
+def search_radius(threshold: float, step: float) -> float:
+    # Two objects that miss by threshold between samples can be this far apart on the grid
+    return threshold + MAX_RELATIVE_SPEED * step / 2
+
+
+def closest_approach(position: np.ndarray, velocity: np.ndarray, step: float) -> Tuple[float, float]:
+    # Time offset and miss distance of linear relative motion, within half a step from the sample
+    speed2 = float(velocity @ velocity)
+    dt = float(np.clip(-(position @ velocity) / speed2, -step / 2, step / 2)) if speed2 > 0 else 0.0
+    return dt, float(np.linalg.norm(position + velocity * dt))
+
+
+def screen_ephemerides(primary, secondary, threshold: float, step: float,
+                       exclude: Optional[Set[Tuple[int, int]]] = None) -> List[Conjunction]:
+    """Close approaches between two ephemerides on the same time grid.
+
+    Secondary objects are put in a k-d tree at every time step and queried with the primary
+    positions, so the cost grows with n log n instead of n_primary * n_secondary. Candidates
+    found at neighbouring samples are reduced to the closest refined approach per encounter.
+    """
+    radius = search_radius(threshold, step)
+    exclude = exclude or set()
+    valid_primary = primary.errors == 0
+    valid_secondary = secondary.errors == 0
+
+    candidates = {}
+    for k in range(len(primary.times)):
+        objects = np.flatnonzero(valid_secondary[:, k])
+        if not len(objects):
+            continue
+        tree = cKDTree(secondary.teme[objects, k])
+        satellites = np.flatnonzero(valid_primary[:, k])
+        for i, found in zip(satellites, tree.query_ball_point(primary.teme[satellites, k], radius)):
+            for j in found:
+                j = objects[j]
+                if (i, j) in exclude:
+                    continue
+                position = secondary.teme[j, k] - primary.teme[i, k]
+                velocity = secondary.velocity[j, k] - primary.velocity[i, k]
+                dt, miss = closest_approach(position, velocity, step)
+                candidates.setdefault((i, j), []).append(
+                    (float(primary.times[k]) + dt, miss, float(np.linalg.norm(velocity)))
+                )
+
+    conjunctions = []
+    for (i, j), approaches in candidates.items():
+        for tca, miss, speed in split_encounters(approaches, step):
+            if miss <= threshold:
+                conjunctions.append(Conjunction(tca, primary.names[i], secondary.names[j], miss, speed))
+    return conjunctions
+
+
+def split_encounters(approaches: List[Tuple[float, float, float]], step: float) -> List[Tuple[float, float, float]]:
+    # (tca, miss, speed) sorted by time -> the closest one of every group of consecutive samples
+    encounters = []
+    for approach in sorted(approaches):
+        if encounters and approach[0] - encounters[-1][1][0] <= 2 * step:
+            best, _ = encounters[-1]
+            encounters[-1] = (min(best, approach, key=lambda item: item[1]), approach)
+        else:
+            encounters.append((approach, approach))
+    return [best for best, _ in encounters]
+
+
+def _screen_chunk(start: float, end: float, step: float, threshold: float) -> List[Conjunction]:
+    times = np.arange(start, end, step, dtype=float)
+    return screen_ephemerides(_primary.propagate(times), _secondary.propagate(times), threshold, step, _same)
+
+
+def merge_conjunctions(conjunctions: List[Conjunction], step: float) -> List[Conjunction]:
+    # An encounter on a chunk boundary is reported by both chunks
+    merged = {}
+    for conjunction in sorted(conjunctions):
+        key = (conjunction.primary, conjunction.secondary)
+        previous = merged.setdefault(key, [])
+        if previous and conjunction.tca - previous[-1].tca <= 2 * step:
+            if conjunction.miss_distance < previous[-1].miss_distance:
+                previous[-1] = conjunction
+            continue
+        previous.append(conjunction)
+    return sorted(
+        (conjunction for found in merged.values() for conjunction in found),
+        key=lambda conjunction: (conjunction.miss_distance, conjunction.tca),
+    )
+
+
+def screen_conjunctions(primary_path: str, secondary_path: str, start: float, end: float, threshold: float = 5.0,
+                        step: float = 5.0, chunk: float = 3600,
+                        max_workers: Optional[int] = None) -> List[Conjunction]:
+    """Conjunction report of the primary catalog against the secondary one, closest first.
+
+    The interval is split into time chunks screened over a process pool; the two catalogs
+    are propagated on the same grid in every chunk.
+    """
+    # Chunk bounds are multiples of step from start, so all chunks share one grid
+    chunk = max(step, chunk // step * step)
+    bounds = np.append(np.arange(start, end, chunk), end)
+
+    conjunctions = []
+    with ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(str(primary_path), str(secondary_path)),
+    ) as executor:
+        futures = [
+            executor.submit(_screen_chunk, float(t0), float(t1), step, threshold)
+            for t0, t1 in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            conjunctions.extend(future.result())
+
+    return merge_conjunctions(conjunctions, step)
@@ -0,0 +1,164 @@
+import struct
+import numpy as np
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sgp4.api import Satrec
+from skyfield.api import load, wgs84, EarthSatellite
+
+MAGIC = b'CPLN'
+VERSION = 1
+HEADER = struct.Struct('<4sHII')
+
+WINDOW_DTYPE = np.dtype([
+    ('rise', '<f8'),
+    ('culmination', '<f8'),
+    ('set', '<f8'),
+    ('max_elevation', '<f4'),
+    ('satellite', '<u2'),
+])
+
+EVENT_RISE, EVENT_CULMINATION, EVENT_SET = 0, 1, 2
+
+
+class ContactWindow(NamedTuple):
+    satellite: str
+    rise: float
+    culmination: float
+    set: float
+    max_elevation: float
+
+
+def unix_to_time(ts, timestamp: float):
+    # ts.utc(1970, 1, 1, 0, 0, seconds) would count leap seconds, unix time does not
+    return ts.from_datetime(datetime.fromtimestamp(timestamp, tz=timezone.utc))
+
+
+def catalog_satellites(catalog: Dict[str, Satrec], ts) -> List[EarthSatellite]:
+    # skyfield satellites from orbital.catalog.load_catalog output
+    satellites = []
+    for name, satrec in catalog.items():
+        satellite = EarthSatellite.from_satrec(satrec, ts)
+        satellite.name = name
+        satellites.append(satellite)
+    return satellites
+
+
+def find_raw_events(satellite: EarthSatellite, observer, t0, t1, altitude_degrees: float) -> List[Tuple]:
+    # (timestamp, event, elevation) as returned by skyfield find_events
+    t, events = satellite.find_events(observer, t0, t1, altitude_degrees=altitude_degrees)
+    if not len(events):
+        return []
+    timestamps = [ti.timestamp() for ti in t.utc_datetime()]
+    elevations = (satellite - observer).at(t).altaz()[0].degrees
+    return [(timestamp, int(event), float(elevation)) for timestamp, event, elevation in zip(timestamps, events, elevations)]
+
+
+def pair_events(events: List[Tuple]) -> List[Tuple]:
+    # (rise, culmination, set, max_elevation) of every complete pass, as in modelling.py
+    passes = []
+    rise = culmination = None
+    max_elevation = -90.0
+    for timestamp, event, elevation in events:
+        if event == EVENT_RISE:
+            rise, culmination, max_elevation = timestamp, None, -90.0
+        elif event == EVENT_CULMINATION:
+            if elevation > max_elevation:
+                culmination, max_elevation = timestamp, elevation
+        elif event == EVENT_SET:
+            if rise is not None and culmination is not None:
+                passes.append((rise, culmination, timestamp, max_elevation))
+            rise = None
+
+    return passes
+
+
+def find_passes(satellite: EarthSatellite, observer, t0, t1, altitude_degrees: float) -> List[Tuple]:
+    return pair_events(find_raw_events(satellite, observer, t0, t1, altitude_degrees))
+
+
+class ContactPlan:
+    """Sorted rise/culmination/set intervals of a constellation over one observer."""
+
+    def __init__(self, names: List[str], windows: np.ndarray) -> None:
+        self.names = names
+        self.windows = np.sort(windows.astype(WINDOW_DTYPE, copy=False), order='rise')
+        self._rise = self.windows['rise']
+        # Any window overlapping t started no earlier than t - max_duration
+        self._max_duration = float((self.windows['set'] - self._rise).max()) if len(self.windows) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    @classmethod
+    def from_passes(cls, passes: dict) -> 'ContactPlan':
+        # {satellite name: [(rise, culmination, set, max_elevation), ...]}
+        names = list(passes)
+        windows = np.array(
+            [(*window, k) for k, name in enumerate(names) for window in passes[name]],
+            dtype=WINDOW_DTYPE,
+        )
+        return cls(names, windows)
+
+    def _window(self, record) -> ContactWindow:
+        return ContactWindow(
+            self.names[record['satellite']],
+            float(record['rise']),
+            float(record['culmination']),
+            float(record['set']),
+            float(record['max_elevation']),
+        )
+
+    def windows_between(self, t0: float, t1: float) -> List[ContactWindow]:
+        # Windows overlapping [t0, t1]: O(log n + k)
+        lower = np.searchsorted(self._rise, t0 - self._max_duration, 'left')
+        upper = np.searchsorted(self._rise, t1, 'right')
+        records = self.windows[lower:upper]
+        return [self._window(record) for record in records[records['set'] > t0]]
+
+    def next_window(self, t: float) -> Optional[ContactWindow]:
+        # Window open at t (the one lasting longest) or else the first one rising after t
+        lower = np.searchsorted(self._rise, t - self._max_duration, 'left')
+        upper = np.searchsorted(self._rise, t, 'right')
+        records = self.windows[lower:upper]
+        records = records[records['set'] > t]
+        if len(records):
+            return self._window(records[np.argmax(records['set'])])
+        if upper < len(self.windows):
+            return self._window(self.windows[upper])
+        return None
+
+    def save(self, path: Path) -> None:
+        names = '\n'.join(self.names).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(names), len(self.windows)))
+            f.write(names)
+            f.write(self.windows.tobytes())
+
+    @classmethod
+    def load(cls, path: Path) -> 'ContactPlan':
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, names_size, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a contact plan file")
+        offset = HEADER.size
+        names = data[offset:offset + names_size].decode('utf-8').split('\n')
+        windows = np.frombuffer(data, dtype=WINDOW_DTYPE, count=count, offset=offset + names_size)
+        return cls(names, windows)
+
+
+def build_contact_plan(satellites: List[EarthSatellite], lat: float, lon: float, elevation_m: float = 0,
+                       start: Optional[float] = None, days: float = 1, altitude_degrees: float = 10) -> ContactPlan:
+    ts = load.timescale()
+    observer = wgs84.latlon(lat, lon, elevation_m=elevation_m)
+    t0 = ts.now() if start is None else unix_to_time(ts, start)
+    t1 = t0 + days
+
+    passes = {
+        satellite.name: find_passes(satellite, observer, t0, t1, altitude_degrees)
+        for satellite in satellites
+    }
+    return ContactPlan.from_passes(passes)
@@ -0,0 +1,81 @@
+import numpy as np
+
+EARTH_RADIUS = 6371
+
+
+# Calculate distance between two points (or arrays of points)
+def haversine_distance(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS):
+    # Convert latitude and longitude to radians
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    # Calculate differences in latitude and longitude
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    # Calculate intermediate variables
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    # Calculate distance in kilometers
+    return radius * c
+
+
+# WGS84 ellipsoid
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+DAY_S = 86400
+
+
+def unix_to_jday(timestamps):
+    # Split into whole day and fraction to keep sub-millisecond precision (as sgp4.api.jday does)
+    timestamps = np.asarray(timestamps, dtype=float)
+    days = np.floor(timestamps / DAY_S)
+    jd = UNIX_EPOCH_JD + days
+    fr = (timestamps - days * DAY_S) / DAY_S
+    return jd, fr
+
+
+def gmst(jd, fr):
+    # IAU 1982 Greenwich mean sidereal time in radians (UT1 ~ UTC)
+    tut1 = ((jd - J2000_JD) + fr) / 36525.0
+    seconds = (
+        -6.2e-6 * tut1 ** 3
+        + 0.093104 * tut1 ** 2
+        + (876600.0 * 3600 + 8640184.812866) * tut1
+        + 67310.54841
+    )
+    return np.mod(np.radians(seconds / 240.0), 2 * np.pi)
+
+
+def teme_to_ecef(position, theta):
+    # Rotate TEME vectors (..., n_times, 3) about the z axis by GMST (polar motion ignored)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    x, y, z = position[..., 0], position[..., 1], position[..., 2]
+    return np.stack([cos_t * x + sin_t * y, -sin_t * x + cos_t * y, z], axis=-1)
+
+
+def ecef_to_geodetic(position, iterations=4):
+    # WGS84 geodetic latitude, longitude (degrees) and height (km)
+    x, y, z = position[..., 0], position[..., 1], position[..., 2]
+    p = np.hypot(x, y)
+    lon = np.arctan2(y, x)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+    height = np.zeros_like(p)
+    for _ in range(iterations):
+        sin_lat = np.sin(lat)
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+        height = p / np.cos(lat) - n
+        lat = np.arctan2(z, p * (1 - WGS84_E2 * n / (n + height)))
+    return np.degrees(lat), np.degrees(lon), height
+
+
+def geodetic_to_ecef(lat, lon, height=0.0):
+    lat, lon = np.radians(lat), np.radians(lon)
+    sin_lat = np.sin(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    x = (n + height) * np.cos(lat) * np.cos(lon)
+    y = (n + height) * np.cos(lat) * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + height) * sin_lat
+    return np.stack([x, y, z], axis=-1)
@@ -0,0 +1,197 @@
+import numpy as np
+
+from collections import deque
+from typing import Dict, List, Tuple
+
+from orbital import geometry
+from orbital.propagator import Ephemeris
+
+# cell: lat row * number of lon columns + lon column
+INTERVAL_DTYPE = np.dtype([
+    ('cell', '<u4'),
+    ('satellite', '<u2'),
+    ('start', '<f8'),
+    ('end', '<f8'),
+])
+
+
+class _CellTable:
+    # Intervals of one ephemeris chunk sorted by (cell, start)
+
+    def __init__(self, start: float, end: float, intervals: np.ndarray) -> None:
+        self.start = start
+        self.end = end
+        self.intervals = intervals
+        self.max_duration = float((intervals['end'] - intervals['start']).max()) if len(intervals) else 0.0
+
+    def lookup(self, cell: int, t0: float, t1: float) -> np.ndarray:
+        cells = self.intervals['cell']
+        first, last = np.searchsorted(cells, cell, 'left'), np.searchsorted(cells, cell, 'right')
+        starts = self.intervals['start'][first:last]
+        # Only intervals starting within max_duration before t0 can still be open at t0
+        lo = first + np.searchsorted(starts, t0 - self.max_duration, 'left')
+        hi = first + np.searchsorted(starts, t1, 'right')
+        found = self.intervals[lo:hi]
+        return found[found['end'] >= t0]
+
+    def lookup_many(self, cells: np.ndarray, t0: float, t1: float) -> np.ndarray:
+        # Same as lookup for a set of cells, filtered in one pass
+        column = self.intervals['cell']
+        first, last = np.searchsorted(column, cells, 'left'), np.searchsorted(column, cells, 'right')
+        rows = np.concatenate([np.arange(lo, hi) for lo, hi in zip(first, last)]) if len(cells) else []
+        found = self.intervals[np.asarray(rows, dtype=np.int64)]
+        return found[(found['start'] <= t1) & (found['end'] >= t0)]
+
+
+class GroundTrackIndex:
+    """Sub-satellite points of the constellation bucketed into lat/lon cells.
+
+    Every cell keeps the time intervals each satellite spends over it, so "who is over this
+    place between t0 and t1" is a binary search instead of a scan of the ground tracks.
+    Intervals are padded by one sample on both sides, so the real cell crossing is always inside.
+    Ephemerides are added as chunks in time order and evicted from the left.
+    """
+
+    def __init__(self, names: List[str], cell_size: float = 1.0) -> None:
+        self.names = names
+        self.cell_size = cell_size
+        self.rows = int(np.ceil(180 / cell_size))
+        self.columns = int(np.ceil(360 / cell_size))
+
+        self._chunks = deque()
+
+    @classmethod
+    def from_ephemeris(cls, ephemeris: Ephemeris, cell_size: float = 1.0) -> 'GroundTrackIndex':
+        index = cls(ephemeris.names, cell_size)
+        index.add(ephemeris)
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(chunk.intervals) for chunk in self._chunks)
+
+    @property
+    def start(self) -> float:
+        return self._chunks[0].start if self._chunks else None
+
+    @property
+    def end(self) -> float:
+        return self._chunks[-1].end if self._chunks else None
+
+    def cells(self, lat, lon):
+        rows = np.clip(np.floor((np.asarray(lat) + 90) / self.cell_size), 0, self.rows - 1).astype(np.int64)
+        columns = np.floor((np.asarray(lon) + 180) / self.cell_size).astype(np.int64) % self.columns
+        return rows * self.columns + columns
+
+    def cell_of(self, lat: float, lon: float) -> int:
+        return int(self.cells(lat, lon))
+
+    def cell_center(self, cell: int) -> Tuple[float, float]:
+        row, column = divmod(cell, self.columns)
+        return (-90 + (row + 0.5) * self.cell_size, -180 + (column + 0.5) * self.cell_size)
+
+    def add(self, ephemeris: Ephemeris) -> None:
+        self.add_intervals(float(ephemeris.times[0]), float(ephemeris.times[-1]), self.track_intervals(ephemeris))
+
+    def add_intervals(self, start: float, end: float, intervals: np.ndarray) -> None:
+        # Attach a chunk built by track_intervals, possibly in another process
+        if self._chunks and start < self._chunks[-1].end:
+            raise ValueError(f"Chunk starting at {start} overlaps the index ending at {self._chunks[-1].end}")
+        self._chunks.append(_CellTable(start, end, intervals))
+
+    def track_intervals(self, ephemeris: Ephemeris) -> np.ndarray:
+        # Cell intervals of one ephemeris chunk sorted by (cell, start); does not touch the index
+        if ephemeris.names != self.names:
+            raise ValueError("Ephemeris satellites do not match the index")
+        times = ephemeris.times
+        cells = self.cells(ephemeris.lat, ephemeris.lon)
+        n_sat, n_t = cells.shape
+        # A new interval starts at every sample where the satellite changes cell
+        entered = np.ones((n_sat, n_t), dtype=bool)
+        entered[:, 1:] = cells[:, 1:] != cells[:, :-1]
+        # Samples of decayed satellites are not indexed
+        entered &= ephemeris.errors == 0
+        satellite, first = np.nonzero(entered)
+
+        following = np.full((n_sat, n_t), n_t - 1)
+        following[:, :-1] = np.where(entered[:, 1:], np.arange(1, n_t), n_t - 1)
+        # Index of the next entry of the same satellite (or the last sample), searched from the right
+        following = np.minimum.accumulate(following[:, ::-1], axis=1)[:, ::-1]
+        last = following[satellite, first]
+
+        intervals = np.empty(len(first), dtype=INTERVAL_DTYPE)
+        intervals['cell'] = cells[satellite, first]
+        intervals['satellite'] = satellite
+        intervals['start'] = times[np.maximum(first - 1, 0)]
+        intervals['end'] = times[last]
+        return intervals[np.lexsort((intervals['start'], intervals['cell']))]
+
+    def evict(self, before: float) -> None:
+        # Drop chunks that ended before 'before'
+        while self._chunks and self._chunks[0].end < before:
+            self._chunks.popleft()
+
+    def cell_intervals(self, cell: int, t0: float, t1: float) -> List[Tuple[str, float, float]]:
+        # (satellite, start, end) of every pass over the cell overlapping [t0, t1], by start
+        result = []
+        for chunk in self._chunks:
+            if chunk.end < t0 or chunk.start > t1:
+                continue
+            found = chunk.lookup(cell, t0, t1)
+            for satellite, start, end in zip(found['satellite'].tolist(), found['start'].tolist(), found['end'].tolist()):
+                result.append((self.names[satellite], start, end))
+        return sorted(result, key=lambda interval: interval[1])
+
+    def satellites_over(self, lat: float, lon: float, t0: float, t1: float) -> List[Tuple[str, float, float]]:
+        return self.cell_intervals(self.cell_of(lat, lon), t0, t1)
+
+    def cells_within(self, lat: float, lon: float, radius: float) -> List[int]:
+        # Cells that may contain points within radius (km) of (lat, lon)
+        angle = np.degrees(radius / geometry.EARTH_RADIUS)
+        half_diagonal = geometry.EARTH_RADIUS * np.radians(self.cell_size) / np.sqrt(2)
+
+        rows = np.arange(
+            max(int((lat - angle + 90) // self.cell_size), 0),
+            min(int((lat + angle + 90) // self.cell_size), self.rows - 1) + 1,
+        )
+        if abs(lat) + angle >= 90:
+            columns = np.arange(self.columns)
+        else:
+            span = np.degrees(np.arcsin(min(np.sin(np.radians(angle)) / np.cos(np.radians(lat)), 1.0)))
+            first = int((lon - span + 180) // self.cell_size) - 1
+            last = int((lon + span + 180) // self.cell_size) + 1
+            columns = np.arange(first, last + 1) % self.columns if last - first + 1 < self.columns \
+                else np.arange(self.columns)
+
+        cells = (rows[:, None] * self.columns + np.unique(columns)[None, :]).ravel()
+        center_lat = -90 + (cells // self.columns + 0.5) * self.cell_size
+        center_lon = -180 + (cells % self.columns + 0.5) * self.cell_size
+        distance = geometry.haversine_distance(lat, lon, center_lat, center_lon)
+        return cells[distance <= radius + half_diagonal].tolist()
+
+    def satellites_near(self, lat: float, lon: float, radius: float, t0: float,
+                        t1: float) -> Dict[str, List[Tuple[float, float]]]:
+        # Merged time intervals when the sub-satellite point may be within radius (km)
+        cells = np.asarray(self.cells_within(lat, lon, radius), dtype=np.int64)
+        intervals = {}
+        for chunk in self._chunks:
+            if chunk.end < t0 or chunk.start > t1:
+                continue
+            found = chunk.lookup_many(cells, t0, t1)
+            for satellite, start, end in zip(found['satellite'].tolist(), found['start'].tolist(), found['end'].tolist()):
+                intervals.setdefault(self.names[satellite], []).append((start, end))
+
+        result = {}
+        for name, spans in intervals.items():
+            merged = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            result[name] = merged
+        return result
+
+    def fleet_coverage(self, observers: List[Tuple[float, float]], radius: float, t0: float,
+                       t1: float) -> List[Dict[str, List[Tuple[float, float]]]]:
+        # satellites_near for every terminal of the fleet, (lat, lon) each
+        return [self.satellites_near(lat, lon, radius, t0, t1) for lat, lon in observers]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from typing import List, Tuple
+
+from orbital.propagator import Ephemeris
+from orbital.visibility import DEFAULT_ELEVATION_MASK, topocentric, windows_from_elevation
+
+# Iridium L-band downlink, MHz
+IRIDIUM_FREQUENCY = 1621.25
+# Everything in the budget except path and atmospheric losses (EIRP + G/T - required C/N0 + constants), dB
+DEFAULT_LINK_BUDGET = 165.0
+
+
+# Простая модель атмосферного затухания (работает и с массивами)
+def basic_atmospheric_attenuation(elevation_angle):
+    # Более сложные модели могут учитывать погодные условия, влажность и другие факторы
+    return np.where(np.asarray(elevation_angle) > 45, 0.5, 1.5)  # дБ, 1.5 дБ из-за низкой элевации
+
+
+def free_space_path_loss(distance, frequency=IRIDIUM_FREQUENCY):
+    # distance in km, frequency in MHz, result in dB
+    return 20 * np.log10(distance) + 20 * np.log10(frequency) + 32.45
+
+
+def link_margin(elevation, distance, budget=DEFAULT_LINK_BUDGET, frequency=IRIDIUM_FREQUENCY):
+    return budget - free_space_path_loss(distance, frequency) - basic_atmospheric_attenuation(elevation)
+
+
+def forecast_link_margin(ephemeris: Ephemeris, lat: float, lon: float, height: float = 0.0,
+                         mask: float = DEFAULT_ELEVATION_MASK, budget: float = DEFAULT_LINK_BUDGET,
+                         frequency: float = IRIDIUM_FREQUENCY) -> Tuple[np.ndarray, np.ndarray]:
+    """Best available link margin (dB) at every time of the ephemeris grid.
+
+    Returns the margin curve (-inf while no satellite is above the mask) and the index
+    of the satellite that provides it (-1 when none).
+    """
+    _, elevation, distance = topocentric(ephemeris.ecef, lat, lon, height)
+    margin = link_margin(elevation, distance, budget, frequency)
+    margin[(elevation < mask) | (ephemeris.errors != 0)] = -np.inf
+
+    best = np.argmax(margin, axis=0)
+    best_margin = margin[best, np.arange(margin.shape[1])]
+    best[np.isneginf(best_margin)] = -1
+    return best_margin, best
+
+
+def high_margin_intervals(times: np.ndarray, margin: np.ndarray, threshold: float) -> List[Tuple]:
+    # (start, peak, end, peak margin) of every interval with margin >= threshold, clipped to the grid
+    finite = np.where(np.isfinite(margin), margin, threshold - 100.0)
+    return windows_from_elevation(times, finite, threshold, clip=True)
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from skyfield.api import load, wgs84
+
+from orbital.catalog import load_catalog
+from orbital.contact_plan import find_raw_events, pair_events, catalog_satellites, unix_to_time
+
+# Worker state: TLEs are parsed once per process by the pool initializer
+_satellites = None
+_observer = None
+_ts = None
+
+
+def _init_worker(catalog_path: str, lat: float, lon: float, elevation_m: float) -> None:
+    global _satellites, _observer, _ts
+    _ts = load.timescale()
+    _satellites = catalog_satellites(load_catalog(catalog_path), _ts)
+    _observer = wgs84.latlon(lat, lon, elevation_m=elevation_m)
+
+
+def _find_chunk_events(index: int, start: float, end: float, altitude_degrees: float) -> Tuple[int, List[Tuple]]:
+    t0 = unix_to_time(_ts, start)
+    t1 = unix_to_time(_ts, end)
+    return index, find_raw_events(_satellites[index], _observer, t0, t1, altitude_degrees)
+
+
+def merge_chunk_events(chunks: List[List[Tuple]], tolerance: float = 1.0) -> List[Tuple]:
+    # Neighbouring chunks share their boundary instant, so an event on it may be reported twice
+    events = sorted((event for chunk in chunks for event in chunk), key=lambda event: event[0])
+    merged = []
+    for event in events:
+        if merged and merged[-1][1] == event[1] and event[0] - merged[-1][0] < tolerance:
+            continue
+        merged.append(event)
+    return merged
+
+
+def find_passes_parallel(catalog_path: str, lat: float, lon: float, elevation_m: float, start: float, end: float,
+                         altitude_degrees: float = 10, chunk: float = 86400,
+                         max_workers: Optional[int] = None) -> Dict[str, List[Tuple]]:
+    """Pass search split by satellite x time chunk over a process pool.
+
+    Passes cut by a chunk boundary are stitched back together: raw events of all chunks
+    are merged in time order before rise/culmination/set pairing.
+    """
+    names = list(load_catalog(catalog_path))
+    bounds = np.append(np.arange(start, end, chunk), end)
+
+    events = {index: [] for index in range(len(names))}
+    with ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(catalog_path, lat, lon, elevation_m),
+    ) as executor:
+        futures = [
+            executor.submit(_find_chunk_events, index, float(t0), float(t1), altitude_degrees)
+            for index in range(len(names))
+            for t0, t1 in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            index, chunk_events = future.result()
+            events[index].append(chunk_events)
+
+    return {names[index]: pair_events(merge_chunk_events(chunks)) for index, chunks in events.items()}
@@ -0,0 +1,141 @@
+import json
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from sgp4.api import Satrec, SatrecArray
+
+from orbital import geometry
+from orbital.propagator import ConstellationPropagator
+from orbital.visibility import DEFAULT_ELEVATION_MASK, find_windows
+
+# Satellites of one plane have slightly different nodes (~0.3 deg for Iridium NEXT)
+PLANE_MARGIN = 1.0
+IRIDIUM_ALTITUDE = 780
+
+
+def load_planes(path: Path, prefix: str = 'IRIDIUM ') -> Dict[str, List[str]]:
+    # data/iridium_next.orbitals.json: {plane: [satellite id, ...]} -> {plane: [catalog name, ...]}
+    with open(path, 'r') as f:
+        planes = json.load(f)
+    return {plane: [f'{prefix}{satellite}' for satellite in satellites] for plane, satellites in planes.items()}
+
+
+def coverage_angle(altitude: float = IRIDIUM_ALTITUDE, mask: float = DEFAULT_ELEVATION_MASK) -> float:
+    # Earth central angle (degrees) between the sub-satellite point and the edge of its footprint
+    mask = np.radians(mask)
+    return float(np.degrees(np.arccos(geometry.EARTH_RADIUS * np.cos(mask) / (geometry.EARTH_RADIUS + altitude)) - mask))
+
+
+def plane_normals(satrecs: List[Satrec], times: np.ndarray) -> np.ndarray:
+    # Unit normals of the orbital planes in ECEF, (n_satellites, n_times, 3)
+    jd, fr = geometry.unix_to_jday(times)
+    _, position, velocity = SatrecArray(satrecs).sgp4(jd, fr)
+    normals = np.cross(position, velocity)
+    normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+    return geometry.teme_to_ecef(normals, geometry.gmst(jd, fr))
+
+
+def track_offset(normals: np.ndarray, lat: float, lon: float) -> np.ndarray:
+    # Angular distance (degrees) from the observer to the great circle of each ground track
+    observer = geometry.geodetic_to_ecef(lat, lon)
+    observer = observer / np.linalg.norm(observer)
+    return np.degrees(np.arcsin(np.clip(np.abs(normals @ observer), 0, 1)))
+
+
+class PlanePruner:
+    """Skips whole orbital planes that cannot come near the observer within a time slice.
+
+    Only one representative satellite per plane is propagated, on a coarse grid: the
+    ground track of every satellite in the plane lies on the same great circle (up to
+    PLANE_MARGIN), so its angular distance from the observer bounds them all.
+    """
+
+    def __init__(self, planes: Dict[str, List[str]], catalog: Dict[str, Satrec]) -> None:
+        self.planes = {
+            plane: [name for name in names if name in catalog]
+            for plane, names in planes.items()
+        }
+        self.planes = {plane: names for plane, names in self.planes.items() if names}
+        grouped = {name for names in self.planes.values() for name in names}
+        # Spares and satellites without plane information are never pruned
+        self.ungrouped = [name for name in catalog if name not in grouped]
+        self._representatives = [catalog[names[0]] for names in self.planes.values()]
+
+    def slice_offsets(self, lat: float, lon: float, start: float, end: float, slice_length: float,
+                      step: float = 60) -> Tuple[np.ndarray, np.ndarray]:
+        """Minimal track offset (degrees) of every plane in every slice, (n_planes, n_slices).
+
+        Returns the slice bounds as well; both bounds of a slice are sampled.
+        """
+        bounds = np.append(np.arange(start, end, slice_length), end)
+        times = np.unique(np.concatenate([np.arange(start, end, step), bounds]))
+        offsets = track_offset(plane_normals(self._representatives, times), lat, lon)
+
+        slices = np.clip(np.searchsorted(bounds, times, 'right') - 1, 0, len(bounds) - 2)
+        minimal = np.full((len(self.planes), len(bounds) - 1), np.inf)
+        for k in range(len(bounds) - 1):
+            # A sample on a bound belongs to both neighbouring slices
+            inside = (slices == k) | (times == bounds[k + 1])
+            minimal[:, k] = offsets[:, inside].min(axis=1)
+        return bounds, minimal
+
+    def relevant_satellites(self, lat: float, lon: float, start: float, end: float, slice_length: float = 3600,
+                            mask: float = DEFAULT_ELEVATION_MASK, altitude: float = IRIDIUM_ALTITUDE,
+                            step: float = 60) -> List[Tuple[float, float, List[str]]]:
+        # (slice start, slice end, satellites that can be above the mask) for every slice
+        bounds, minimal = self.slice_offsets(lat, lon, start, end, slice_length, step)
+        # The plane turns by ~0.25 deg per minute relative to the Earth: allow for sampling
+        limit = coverage_angle(altitude, mask) + PLANE_MARGIN + step / 240
+        planes = list(self.planes.values())
+        return [
+            (
+                float(bounds[k]),
+                float(bounds[k + 1]),
+                [name for p, names in enumerate(planes) if minimal[p, k] <= limit for name in names] + self.ungrouped,
+            )
+            for k in range(len(bounds) - 1)
+        ]
+
+
+def stitch_windows(blocks: List[Tuple[float, Dict[str, List[Tuple]]]]) -> Dict[str, List[Tuple]]:
+    # Join clipped windows of consecutive slices that meet on the shared bound
+    stitched = {}
+    for start, windows in blocks:
+        for name, passes in windows.items():
+            result = stitched.setdefault(name, [])
+            for window in passes:
+                if result and window[0] == start and result[-1][2] == start:
+                    rise, culmination, _, max_elevation = result[-1]
+                    if window[3] > max_elevation:
+                        culmination, max_elevation = window[1], window[3]
+                    result[-1] = (rise, culmination, window[2], max_elevation)
+                else:
+                    result.append(tuple(window))
+    return stitched
+
+
+def find_windows_pruned(pruner: PlanePruner, catalog: Dict[str, Satrec], lat: float, lon: float, height: float,
+                        start: float, duration: float, step: float = 10, slice_length: float = 3600,
+                        mask: float = DEFAULT_ELEVATION_MASK, clip: bool = True) -> Dict[str, List[Tuple]]:
+    """find_windows over [start, start + duration] propagating only satellites of relevant planes.
+
+    Windows cut by a slice bound are stitched back; windows open at the very start or end
+    are kept clipped, or dropped if clip is not set (as in find_windows).
+    """
+    blocks = []
+    for t0, t1, names in pruner.relevant_satellites(lat, lon, start, start + duration, slice_length, mask):
+        if not names:
+            continue
+        times = np.append(np.arange(t0, t1, step), t1)
+        ephemeris = ConstellationPropagator({name: catalog[name] for name in names}).propagate(times)
+        blocks.append((t0, find_windows(ephemeris, lat, lon, height, mask, clip=True)))
+    windows = stitch_windows(blocks)
+    if not clip:
+        end = start + duration
+        windows = {
+            name: [window for window in passes if window[0] > start and window[2] < end]
+            for name, passes in windows.items()
+        }
+    return windows
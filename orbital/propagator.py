@@ -0,0 +1,93 @@
+import numpy as np
+
+from typing import Dict, List, Optional
+
+from sgp4.api import Satrec, SatrecArray
+
+from orbital import geometry
+from orbital.catalog import load_catalog
+
+
+def time_grid(start: float, duration: float, step: float = 1) -> np.ndarray:
+    # Unix timestamps start + step ... start + duration (same grid as main.py)
+    return start + np.arange(step, duration + step, step, dtype=float)
+
+
+class Ephemeris:
+    """Dense ephemeris of several satellites on a common time grid."""
+
+    def __init__(self, names: List[str], times: np.ndarray, teme: np.ndarray, velocity: np.ndarray,
+                 errors: np.ndarray) -> None:
+        self.names = names
+        self.times = times
+        # (n_satellites, n_times, 3), km and km/s
+        self.teme = teme
+        self.velocity = velocity
+        # Non-zero sgp4 error codes (decayed satellites etc.), (n_satellites, n_times)
+        self.errors = errors
+
+        self._ecef = None
+        self._geodetic = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def ecef(self) -> np.ndarray:
+        if self._ecef is None:
+            jd, fr = geometry.unix_to_jday(self.times)
+            self._ecef = geometry.teme_to_ecef(self.teme, geometry.gmst(jd, fr))
+        return self._ecef
+
+    @property
+    def geodetic(self):
+        # lat, lon (degrees), height (km), each (n_satellites, n_times)
+        if self._geodetic is None:
+            self._geodetic = geometry.ecef_to_geodetic(self.ecef)
+        return self._geodetic
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.geodetic[0]
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self.geodetic[1]
+
+    @property
+    def height(self) -> np.ndarray:
+        return self.geodetic[2]
+
+    def index(self, name: str) -> int:
+        return self.names.index(name)
+
+
+class ConstellationPropagator:
+    """Propagates a whole constellation over a time grid with one SatrecArray call."""
+
+    def __init__(self, satellites: Dict[str, Satrec]) -> None:
+        self.names = list(satellites)
+        self.satrecs = list(satellites.values())
+        self._array = SatrecArray(self.satrecs)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_tle(cls, tle: Dict[str, List[str]], names: Optional[List[str]] = None) -> 'ConstellationPropagator':
+        # 'tle' as returned by main.import_data_tle: {name: [line1, line2]}
+        names = names if names is not None else list(tle)
+        return cls({name: Satrec.twoline2rv(*tle[name]) for name in names})
+
+    @classmethod
+    def from_catalog(cls, path, names: Optional[List[str]] = None) -> 'ConstellationPropagator':
+        # Any catalog format supported by orbital.catalog (cached between runs)
+        catalog = load_catalog(path)
+        names = names if names is not None else list(catalog)
+        return cls({name: catalog[name] for name in names})
+
+    def propagate(self, times: np.ndarray) -> Ephemeris:
+        times = np.asarray(times, dtype=float)
+        jd, fr = geometry.unix_to_jday(times)
+        errors, teme, velocity = self._array.sgp4(jd, fr)
+        return Ephemeris(self.names, times, teme, velocity, errors)
@@ -0,0 +1,235 @@
+import bisect
+import numpy as np
+
+from typing import Dict, List, Optional, Tuple
+
+from orbital.catalog import load_catalog
+from orbital.chebyshev import ChebyshevEphemeris
+from orbital.contact_plan import ContactWindow
+from orbital.ground_index import GroundTrackIndex
+from orbital.planes import PlanePruner, load_planes
+from orbital.propagator import ConstellationPropagator, Ephemeris
+from orbital.visibility import DEFAULT_ELEVATION_MASK, find_windows
+
+# Worker state: the catalog is parsed once per process
+_propagator = None
+_pruner = None
+
+
+def _init_worker(catalog_path: str, planes_path: Optional[str] = None) -> None:
+    global _propagator, _pruner
+    catalog = load_catalog(catalog_path)
+    _propagator = ConstellationPropagator(catalog)
+    _pruner = PlanePruner(load_planes(planes_path), catalog) if planes_path else None
+
+
+def find_block_windows(ephemeris: ChebyshevEphemeris, start: float, duration: float,
+                       observer: Tuple[float, float, float], mask: float = DEFAULT_ELEVATION_MASK, step: float = 10,
+                       pruner: Optional[PlanePruner] = None) -> Dict[str, List[Tuple]]:
+    # Clipped windows of a fitted block; with a pruner only satellites of planes that can reach
+    # the observer within the block are evaluated
+    if pruner is not None:
+        (_, _, names), = pruner.relevant_satellites(observer[0], observer[1], start, start + duration, duration, mask)
+        ephemeris = ephemeris.subset(names)
+    return find_windows(ephemeris.ephemeris(block_times(start, duration, step)), *observer, mask=mask, clip=True)
+
+
+def block_times(start: float, duration: float, step: float = 10) -> np.ndarray:
+    # Both block bounds are on the grid, so windows cut by a bound can be stitched exactly
+    return np.append(np.arange(start, start + duration, step), start + duration)
+
+
+def build_block(start: float, duration: float, observer: Tuple[float, float, float],
+                mask: float = DEFAULT_ELEVATION_MASK, step: float = 10, segment: float = 900,
+                cell_size: Optional[float] = None):
+    """Fits one block of the rolling ephemeris and finds its (clipped) contact windows.
+
+    With cell_size, also builds the block's GroundTrackIndex intervals on the same grid.
+    Runs in a worker process; returns picklable arrays only.
+    """
+    ephemeris = ChebyshevEphemeris.fit(_propagator, start, duration, segment)
+    windows = find_block_windows(ephemeris, start, duration, observer, mask, step, _pruner)
+    intervals = None
+    if cell_size is not None:
+        intervals = GroundTrackIndex(ephemeris.names, cell_size).track_intervals(
+            ephemeris.ephemeris(block_times(start, duration, step))
+        )
+    return start, ephemeris.coefficients, ephemeris.max_error, windows, intervals
+
+
+class RollingEphemeris:
+    """Ephemeris and contact windows over a sliding interval, extended block by block.
+
+    Blocks are addressed by (t - origin) // block, so position lookups are O(1); windows are
+    kept sorted by rise in a list that is only appended to and evicted from the left, and are
+    looked up by bisection bounded by the longest window, as in ContactPlan: O(log n + k).
+    """
+
+    def __init__(self, names: List[str], origin: float, observer: Tuple[float, float, float], block: float = 3600,
+                 segment: float = 900, mask: float = DEFAULT_ELEVATION_MASK, step: float = 10,
+                 pruner: Optional[PlanePruner] = None) -> None:
+        self.names = names
+        self.origin = origin
+        self.block = block
+        self.segment = segment
+        # lat, lon (degrees), height (km) the windows are computed for
+        self.observer = tuple(observer)
+        self.mask = mask
+        self.step = step
+        # Skips planes that cannot reach the observer when windows are searched
+        self.pruner = pruner
+
+        self._blocks: Dict[int, ChebyshevEphemeris] = {}
+        self._windows: List[ContactWindow] = []
+        # Rises of _windows for bisection; any window overlapping t rose no earlier than t - _max_duration
+        self._rises: List[float] = []
+        self._max_duration = 0.0
+        self._last_block = None
+        self._evicted = None
+
+    @classmethod
+    def from_catalog(cls, catalog_path, origin: float, observer: Tuple[float, float, float], block: float = 3600,
+                     segment: float = 900, mask: float = DEFAULT_ELEVATION_MASK, step: float = 10,
+                     planes_path=None) -> 'RollingEphemeris':
+        catalog = load_catalog(catalog_path)
+        pruner = PlanePruner(load_planes(planes_path), catalog) if planes_path else None
+        return cls(list(catalog), origin, observer, block, segment, mask, step, pruner)
+
+    def _index(self, t: float) -> int:
+        return int((t - self.origin) // self.block)
+
+    def block_start(self, index: int) -> float:
+        return self.origin + index * self.block
+
+    def covered_until(self) -> float:
+        return self.origin if self._last_block is None else self.block_start(self._last_block + 1)
+
+    def missing_blocks(self, start: float, end: float) -> List[int]:
+        # Blocks needed to cover [start, end] that are not built yet, in time order
+        first = self._index(start) if self._last_block is None else max(self._index(start), self._last_block + 1)
+        return list(range(first, self._index(end) + 1))
+
+    def add_block(self, start: float, coefficients: np.ndarray, max_error: float, windows: Dict[str, List[Tuple]],
+                  observer: Optional[Tuple[float, float, float]] = None) -> None:
+        index = self._index(start)
+        if self._last_block is not None and index != self._last_block + 1:
+            raise ValueError(f"Block {index} does not continue block {self._last_block}")
+        self._blocks[index] = ChebyshevEphemeris(self.names, start, self.segment, np.asarray(coefficients), max_error)
+        self._last_block = index
+
+        if observer is not None and tuple(observer) != self.observer:
+            # The terminal moved while the block was being built
+            windows = self.block_windows(index, self.observer)
+        self._append_windows(start, windows)
+
+    def block_ephemeris(self, index: int, blocks: Optional[Dict[int, ChebyshevEphemeris]] = None) -> Ephemeris:
+        # Dense ephemeris of an already fitted block on the window search grid: polynomial evaluation only, no SGP4
+        times = block_times(self.block_start(index), self.block, self.step)
+        return (self._blocks if blocks is None else blocks)[index].ephemeris(times)
+
+    def block_windows(self, index: int, observer: Tuple[float, float, float],
+                      blocks: Optional[Dict[int, ChebyshevEphemeris]] = None) -> Dict[str, List[Tuple]]:
+        # Windows of an already fitted block for any observer
+        ephemeris = (self._blocks if blocks is None else blocks)[index]
+        return find_block_windows(ephemeris, self.block_start(index), self.block, observer, self.mask, self.step,
+                                  self.pruner)
+
+    def snapshot(self) -> Dict[int, ChebyshevEphemeris]:
+        # Blocks for replan_windows in another thread: add_block and evict keep changing _blocks meanwhile
+        return dict(self._blocks)
+
+    def replan_windows(self, observer: Tuple[float, float, float],
+                       blocks: Dict[int, ChebyshevEphemeris]) -> Dict[int, Dict[str, List[Tuple]]]:
+        # Reads only the snapshot, may run in a worker thread; the result is installed with set_windows
+        return {index: self.block_windows(index, observer, blocks) for index in sorted(blocks)}
+
+    def set_windows(self, observer: Tuple[float, float, float], blocks: Dict[int, Dict[str, List[Tuple]]]) -> None:
+        # observer must already be self.observer (set before the replan started), otherwise a newer replan wins
+        if tuple(observer) != self.observer:
+            return
+        # Windows are stitched across block bounds, so the buffer is rebuilt in block order. Blocks evicted
+        # since the snapshot still stitch windows that continue into kept blocks; blocks added since the
+        # snapshot are recomputed for the current observer
+        first = min(self._blocks, default=None)
+        indices = sorted(index for index in blocks if first is None or index < first) + sorted(self._blocks)
+        self._windows.clear()
+        self._rises.clear()
+        self._max_duration = 0.0
+        for index in indices:
+            windows = blocks[index] if index in blocks else self.block_windows(index, self.observer)
+            self._append_windows(self.block_start(index), windows)
+        self._evict_windows()
+
+    def _append_windows(self, start: float, windows: Dict[str, List[Tuple]]) -> None:
+        # Windows still open at the previous block end continue into this block
+        open_windows = {}
+        for k in range(len(self._windows) - 1, -1, -1):
+            window = self._windows[k]
+            if window.set < start:
+                if window.rise < start - self.block:
+                    break
+                continue
+            if window.set == start:
+                open_windows[window.satellite] = k
+
+        new_windows = []
+        for name, passes in windows.items():
+            for rise, culmination, set_, max_elevation in passes:
+                k = open_windows.pop(name, None) if rise == start else None
+                if k is None:
+                    new_windows.append(ContactWindow(name, rise, culmination, set_, max_elevation))
+                    continue
+                previous = self._windows[k]
+                if max_elevation < previous.max_elevation:
+                    culmination, max_elevation = previous.culmination, previous.max_elevation
+                self._windows[k] = ContactWindow(name, previous.rise, culmination, set_, max_elevation)
+                self._max_duration = max(self._max_duration, set_ - previous.rise)
+
+        new_windows.sort(key=lambda window: window.rise)
+        self._windows.extend(new_windows)
+        self._rises.extend(window.rise for window in new_windows)
+        self._max_duration = max([self._max_duration, *(window.set - window.rise for window in new_windows)])
+
+    def evict(self, before: float) -> None:
+        # Drop blocks and windows that ended before 'before'
+        for index in [index for index in self._blocks if self.block_start(index + 1) <= before]:
+            del self._blocks[index]
+        self._evicted = before
+        self._evict_windows()
+
+    def _evict_windows(self) -> None:
+        if self._evicted is None:
+            return
+        count = 0
+        while count < len(self._windows) and self._windows[count].set < self._evicted:
+            count += 1
+        del self._windows[:count]
+        del self._rises[:count]
+
+    def ephemeris_at(self, t: float) -> ChebyshevEphemeris:
+        block = self._blocks.get(self._index(t))
+        if block is None:
+            raise ValueError(f"Time {t} is outside of the rolling ephemeris")
+        return block
+
+    def position(self, satellite: str, t: float) -> tuple:
+        return self.ephemeris_at(t).position(satellite, t)
+
+    def geodetic(self, satellite: str, t: float):
+        return self.ephemeris_at(t).geodetic(satellite, t)
+
+    def next_window(self, t: float) -> Optional[ContactWindow]:
+        # Window open at t (the one lasting longest) or else the first one rising after t
+        lower = bisect.bisect_left(self._rises, t - self._max_duration)
+        upper = bisect.bisect_right(self._rises, t)
+        best = max((window for window in self._windows[lower:upper] if window.set > t),
+                   key=lambda window: window.set, default=None)
+        if best is None and upper < len(self._windows):
+            return self._windows[upper]
+        return best
+
+    def windows_between(self, t0: float, t1: float) -> List[ContactWindow]:
+        # Windows overlapping [t0, t1]: O(log n + k)
+        lower = bisect.bisect_left(self._rises, t0 - self._max_duration)
+        upper = bisect.bisect_right(self._rises, t1)
+        return [window for window in self._windows[lower:upper] if window.set > t0]
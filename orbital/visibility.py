@@ -0,0 +1,150 @@
+import numpy as np
+
+from typing import Dict, List, Tuple
+
+from orbital import geometry
+from orbital.propagator import Ephemeris
+
+# Iridium terminals need the satellite at least ~8.2 degrees above the horizon
+DEFAULT_ELEVATION_MASK = 8.2
+
+
+def enu_basis(lat, lon) -> np.ndarray:
+    # Rows: east, north, up unit vectors of a geodetic observer in ECEF
+    lat, lon = np.radians(lat), np.radians(lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    return np.array([
+        [-sin_lon, cos_lon, 0.0],
+        [-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat],
+        [cos_lat * cos_lon, cos_lat * sin_lon, sin_lat],
+    ])
+
+
+def topocentric(ecef: np.ndarray, lat: float, lon: float, height: float = 0.0):
+    """Azimuth, elevation (degrees) and range (km) of ECEF positions (..., 3) seen from the observer.
+
+    height is in km above the WGS84 ellipsoid.
+    """
+    relative = ecef - geometry.geodetic_to_ecef(lat, lon, height)
+    east, north, up = np.moveaxis(relative @ enu_basis(lat, lon).T, -1, 0)
+    azimuth = np.degrees(np.arctan2(east, north)) % 360
+    elevation = np.degrees(np.arctan2(up, np.hypot(east, north)))
+    return azimuth, elevation, np.sqrt(east ** 2 + north ** 2 + up ** 2)
+
+
+def visibility_mask(elevation: np.ndarray, mask: float = DEFAULT_ELEVATION_MASK) -> np.ndarray:
+    return elevation >= mask
+
+
+def _crossing(times: np.ndarray, elevation: np.ndarray, i: int, mask: float) -> float:
+    # Linear interpolation of the mask crossing between samples i and i + 1
+    e0, e1 = elevation[i], elevation[i + 1]
+    return float(times[i] + (mask - e0) / (e1 - e0) * (times[i + 1] - times[i]))
+
+
+def _culmination(times: np.ndarray, elevation: np.ndarray, i: int) -> Tuple[float, float]:
+    # Parabola through the highest sample and its neighbours (uniform grid)
+    if 0 < i < len(times) - 1:
+        e0, e1, e2 = elevation[i - 1], elevation[i], elevation[i + 1]
+        denominator = e0 - 2 * e1 + e2
+        if denominator < 0:
+            shift = 0.5 * (e0 - e2) / denominator
+            step = times[i + 1] - times[i]
+            return float(times[i] + shift * step), float(e1 - 0.25 * (e0 - e2) * shift)
+    return float(times[i]), float(elevation[i])
+
+
+def windows_from_elevation(times: np.ndarray, elevation: np.ndarray, mask: float = DEFAULT_ELEVATION_MASK,
+                           clip: bool = False) -> List[Tuple]:
+    """(rise, culmination, set, max_elevation) of one satellite's elevation series.
+
+    Windows already open at the first sample or still open at the last one are dropped,
+    as in find_events pairing, unless clip is set: then they are cut at the grid bounds.
+    """
+    visible = visibility_mask(elevation, mask)
+    edges = np.flatnonzero(np.diff(visible.astype(np.int8)))
+    starts = list(edges[visible[edges + 1]] + 1)
+    ends = list(edges[visible[edges]])
+    if visible[0]:
+        starts.insert(0, 0)
+    if visible[-1]:
+        ends.append(len(times) - 1)
+
+    windows = []
+    for start, end in zip(starts, ends):
+        opened, closed = start > 0, end < len(times) - 1
+        if not clip and not (opened and closed):
+            continue
+        rise = _crossing(times, elevation, start - 1, mask) if opened else float(times[start])
+        set_ = _crossing(times, elevation, end, mask) if closed else float(times[end])
+        peak = start + int(np.argmax(elevation[start:end + 1]))
+        culmination, max_elevation = _culmination(times, elevation, peak)
+        windows.append((rise, culmination, set_, max_elevation))
+    return windows
+
+
+def find_windows(ephemeris: Ephemeris, lat: float, lon: float, height: float = 0.0,
+                 mask: float = DEFAULT_ELEVATION_MASK, clip: bool = False) -> Dict[str, List[Tuple]]:
+    # Line-of-sight contact windows of every satellite in the ephemeris, computed in bulk
+    _, elevation, _ = topocentric(ephemeris.ecef, lat, lon, height)
+    elevation = np.where(ephemeris.errors == 0, elevation, -90.0)
+    return {
+        name: windows_from_elevation(ephemeris.times, elevation[k], mask, clip)
+        for k, name in enumerate(ephemeris.names)
+    }
+
+
+def fleet_elevation(ecef: np.ndarray, observers: np.ndarray) -> np.ndarray:
+    """Elevation (degrees) of ECEF positions (n_satellites, n_times, 3) for many observers.
+
+    observers is (m, 3) of lat, lon (degrees) and height (km). Only dot products with the
+    observers' up vectors are needed, so the whole chunk is two matrix products:
+    sin(el) = (s - o) . up / |s - o|. Returns (m, n_satellites, n_times).
+    """
+    lat, lon, height = observers[:, 0], observers[:, 1], observers[:, 2]
+    position = geometry.geodetic_to_ecef(lat, lon, height)
+    lat_r, lon_r = np.radians(lat), np.radians(lon)
+    up = np.stack([np.cos(lat_r) * np.cos(lon_r), np.cos(lat_r) * np.sin(lon_r), np.sin(lat_r)], axis=-1)
+
+    satellites = ecef.reshape(-1, 3)
+    # In-place arithmetic: the (n_satellites * n_times, m) temporaries dominate the cost
+    sin_elevation = satellites @ up.T
+    sin_elevation -= np.einsum('ij,ij->i', position, up)
+    distance = satellites @ position.T
+    distance *= -2
+    distance += np.einsum('ij,ij->i', satellites, satellites)[:, None]
+    distance += np.einsum('ij,ij->i', position, position)
+    np.sqrt(distance, out=distance)
+    sin_elevation /= distance
+    np.clip(sin_elevation, -1, 1, out=sin_elevation)
+    elevation = np.degrees(np.arcsin(sin_elevation, out=sin_elevation), out=sin_elevation)
+    return np.ascontiguousarray(elevation.T).reshape(len(observers), *ecef.shape[:2])
+
+
+def find_fleet_windows(ephemeris: Ephemeris, observers, mask: float = DEFAULT_ELEVATION_MASK, clip: bool = False,
+                       memory_limit: int = 256 * 2 ** 20) -> List[Dict[str, List[Tuple]]]:
+    """Contact windows for every observer from one propagated ephemeris.
+
+    observers: (m, 2) lat, lon or (m, 3) lat, lon, height (km). Observers are processed
+    in chunks so that one chunk of elevations fits in memory_limit bytes.
+    """
+    observers = np.atleast_2d(np.asarray(observers, dtype=float))
+    if observers.shape[1] == 2:
+        observers = np.column_stack([observers, np.zeros(len(observers))])
+
+    ecef = ephemeris.ecef
+    valid = ephemeris.errors == 0
+    chunk = max(1, memory_limit // (ecef[..., 0].size * 8 * 3))
+
+    fleet = []
+    for first in range(0, len(observers), chunk):
+        elevation = fleet_elevation(ecef, observers[first:first + chunk])
+        elevation[:, ~valid] = -90.0
+        visible = (elevation >= mask).any(axis=-1)
+        for k in range(len(elevation)):
+            fleet.append({
+                name: windows_from_elevation(ephemeris.times, elevation[k, i], mask, clip) if visible[k, i] else []
+                for i, name in enumerate(ephemeris.names)
+            })
+    return fleet
@@ -2,20 +2,28 @@ import asyncio
 from pathlib import Path
 
 from pydantic import Field
+from typing import Optional, Union
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
 from logging import getLogger
 
 from common.utils import read_csv, load_json
 from common.model import BaseMQTTService, BaseMQTTServiceConfig
+from common.partition import partition_topic
 
 import json
 import pandas as pd
+import paho.mqtt.client as mqtt
 
 log = getLogger(__name__)
 
 
 class FilePublisherConfig(BaseMQTTServiceConfig):
     file_to_publish: Path = Field(description="Путь к файлу, который будем высвобождать")
+    device_field: Optional[Union[int, str]] = Field(None, description="Поле записи с ключом устройства")
+    partitions: int = Field(0, description="Число разделов топика по ключу устройства (0 - без разделов)")
 
 
 class FilePublisher(BaseMQTTService):
@@ -23,6 +31,8 @@ class FilePublisher(BaseMQTTService):
         super().__init__(config=config)
 
         self.file_to_publish = Path(config.file_to_publish)
+        self.device_field = config.device_field
+        self.partitions = config.partitions
 
         if not self.file_to_publish.is_file():
             log.info(f"No file found at {self.file_to_publish}")
@@ -34,6 +44,19 @@ class FilePublisher(BaseMQTTService):
         await self.publish_messages()
         await self.disconnect()
 
+    def route(self, message: dict):
+        # Сообщения одного устройства идут в один раздел топика и обрабатываются одним процессом движка
+        device = message.get(self.device_field) if self.device_field is not None else None
+        if device is None:
+            return self._topic, None
+        device = str(device)
+        topic = partition_topic(self._topic, device, self.partitions) if self.partitions else self._topic
+        properties = None
+        if self._protocol == mqtt.MQTTv5:
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.UserProperty = ('device', device)
+        return topic, properties
+
     @staticmethod
     def process_file(file_path: Path):
         file_type = file_path.suffix
@@ -50,9 +73,9 @@ class FilePublisher(BaseMQTTService):
         return data
 
     async def publish_messages(self):
-        loop = asyncio.get_event_loop()
-
         for message in self.data:
-            await loop.run_in_executor(None, self._client.publish, self._topic, json.dumps(message))
+            topic, properties = self.route(message)
+            # publish только ставит пакет в очередь, отправку выполняет цикл событий
+            self._client.publish(topic, json.dumps(message), properties=properties)
                 # log.info(f"Published: {message.strip()}")
             await asyncio.sleep(self._timeout * 0.5)  # Ожидание перед следующим сообщением
@@ -1,5 +1,10 @@
 import asyncio
 import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+import time
 
 from datetime import datetime
 from pathlib import Path
@@ -41,6 +46,7 @@ def main():
         choices=['engine', 'publisher'],
         help='Specify the service to run: "engine" or "publisher"'
     )
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of engine worker processes')
 
     args = parser.parse_args()
 
@@ -53,22 +59,109 @@ def main():
     # Инициализация и запуск сервиса в зависимости от аргумента
     if args.service == 'engine':
         config = EngineConfig.parse_obj(load_yaml(config_path))
+        if args.workers > 1:
+            sys.exit(supervise(config.model_copy(update={'workers': args.workers})))
         service = Engine(config)
     else:
         config = FilePublisherConfig.parse_obj(load_yaml(config_path))
         service = FilePublisher(config)
         print(service.data)
 
+    serve(service)
+
+
+def serve(service) -> None:
     loop = asyncio.get_event_loop()
 
     start_timestamp = datetime.now()
     loop.run_until_complete(service.init())
     log.debug(f'App engine initialized ({datetime.now() - start_timestamp} sec)')
-    loop.create_task(service.run())
+    task = loop.create_task(service.run())
+    stopping = []
+
+    async def shutdown():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        try:
+            await service.stop()
+        except Exception:
+            log.exception("Service was not stopped cleanly")
+        rest = [other for other in asyncio.all_tasks() if other is not asyncio.current_task()]
+        for other in rest:
+            other.cancel()
+        await asyncio.gather(*rest, return_exceptions=True)
+        loop.stop()
+
+    def stop(signum):
+        # Повторный сигнал во время остановки ничего не меняет
+        if stopping:
+            return
+        log.info(f"Signal {signum} received, stopping")
+        stopping.append(loop.create_task(shutdown()))
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop, signum)
     loop.run_forever()
     # service.init()
     # service.run()
 
 
+def run_worker(config: EngineConfig, worker: int) -> None:
+    # Обработчики сигналов супервизора наследуются при fork; до их замены в serve сигнал завершает процесс
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    serve(Engine(config.model_copy(update={'worker': worker})))
+
+
+def supervise(config: EngineConfig, restart_delay: float = 5.0, max_restart_delay: float = 300.0,
+              max_restarts: int = 10, stop_timeout: float = 30.0) -> int:
+    # Процесс на каждого обработчика; упавший перезапускается с растущей задержкой, чтобы его разделы
+    # топика не простаивали. Процесс, проработавший дольше max_restart_delay, считается исправным
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        log.info(f"Signal {signum} received, stopping engine workers")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes, started, failures, restart_at = {}, {}, {}, {}
+    code = 0
+    while not stopping.is_set():
+        now = time.monotonic()
+        for worker in range(config.workers):
+            process = processes.get(worker)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None and worker not in restart_at:
+                failures[worker] = 1 if now - started[worker] > max_restart_delay else failures.get(worker, 0) + 1
+                if failures[worker] > max_restarts:
+                    log.error(f"Engine worker {worker} failed {max_restarts} times in a row, stopping")
+                    code = 1
+                    stopping.set()
+                    break
+                delay = min(restart_delay * 2 ** (failures[worker] - 1), max_restart_delay)
+                log.warning(f"Engine worker {worker} exited with code {process.exitcode}, restarting in {delay:g} sec")
+                restart_at[worker] = now + delay
+            if restart_at.get(worker, now) > now:
+                continue
+            restart_at.pop(worker, None)
+            processes[worker] = multiprocessing.Process(target=run_worker, args=(config, worker), name=f'engine-{worker}')
+            processes[worker].start()
+            started[worker] = now
+        stopping.wait(1.0)
+
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+    for process in processes.values():
+        process.join(stop_timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+    return code
+
+
 if __name__ == '__main__':
     main()
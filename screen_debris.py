@@ -0,0 +1,49 @@
+import argparse
+import json
+import pathlib
+
+from common.utils import seconds_to_dateformat, timer_func
+from orbital.catalog import load_catalog
+from orbital.conjunction import screen_conjunctions
+
+
+@timer_func('CONJUNCTIONS SCREENED ({} sec)')
+def screen_debris(primary: pathlib.Path, debris: pathlib.Path, start: float, hours: float, threshold: float,
+                  step: float, chunk: float, workers: int):
+    return screen_conjunctions(primary, debris, start, start + hours * 3600, threshold, step, chunk, workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Screen a satellite catalog for close approaches with debris')
+    parser.add_argument('--primary', '-p', type=str, default='data/iridium-NEXT.tle', help='Catalog of protected satellites')
+    parser.add_argument('--debris', '-d', type=str, default='data/iridium_33_debris.json', help='Catalog of debris objects')
+    parser.add_argument('--start', type=float, default=None, help='Unix timestamp of the screening start (latest primary epoch by default)')
+    parser.add_argument('--hours', type=float, default=24, help='Screening interval in hours')
+    parser.add_argument('--threshold', '-t', type=float, default=5.0, help='Reported miss distance, km')
+    parser.add_argument('--step', type=float, default=5.0, help='Propagation grid step, seconds')
+    parser.add_argument('--chunk', type=float, default=3600, help='Time chunk per task, seconds')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Number of processes (all cores by default)')
+    parser.add_argument('--output', '-o', type=str, default=None, help='Write the report as JSON')
+
+    args = parser.parse_args()
+
+    start = args.start
+    if start is None:
+        # TLE accuracy degrades quickly away from the epoch
+        start = max(
+            (satrec.jdsatepoch - 2440587.5 + satrec.jdsatepochF) * 86400
+            for satrec in load_catalog(args.primary).values()
+        )
+
+    report = screen_debris(
+        pathlib.Path(args.primary), pathlib.Path(args.debris), start, args.hours, args.threshold, args.step,
+        args.chunk, args.workers,
+    )
+    for conjunction in report:
+        print(f'{seconds_to_dateformat(int(conjunction.tca), "%Y-%m-%d %H:%M:%S")}  {conjunction.primary:<20} '
+              f'{conjunction.secondary:<24} {conjunction.miss_distance:8.3f} km  {conjunction.relative_speed:6.2f} km/s')
+    print(f'{len(report)} conjunctions closer than {args.threshold} km')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([conjunction._asdict() for conjunction in report], f, indent=4)